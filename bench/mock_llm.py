@@ -0,0 +1,224 @@
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from core.prompts import CONTINUE_PROMPT, count_tokens
+from core.roadmap import SECTION_TITLES
+
+
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+CHUNK_INTERVAL = 0.02
+FILLER = ("Guru membimbing siswa mengamati contoh nyata dari lingkungan sekitar, lalu siswa berdiskusi dalam kelompok kecil "
+          "untuk menuliskan temuan mereka dan mempresentasikannya di depan kelas dengan bantuan lembar kerja.")
+
+
+def section_body(title: str, words: int = 60):
+    filler = FILLER.split()
+    return " ".join(filler[index % len(filler)] for index in range(words)) + f" ({title})"
+
+def mock_roadmap(meetings: int = 2, steps: int = 4):
+    # Same shape as a real roadmap, so parse_roadmap, the parallel and the chunked engines all accept it
+    sections = {
+        "Kriteria Pengajaran": "- Kelas : 7\n- Mata Pelajaran : IPA\n- Topik : Zat dan Perubahannya\n- Gaya Belajar : Experiential Learning",
+        "Objektif Capaian": "\n".join(f"{number}. {section_body('Objektif', 20)}" for number in range(1, 4)),
+        "Road Map Pengajaran": "\n\n".join(meeting_body(f"Pertemuan {number}: Tema {number}", steps) for number in range(1, meetings + 1)),
+    }
+    for title in SECTION_TITLES[3:]:
+        sections[title] = section_body(title)
+
+    return "\n\n".join(f"**{title}**\n\n{body}" for title, body in sections.items()) + "\n"
+
+def meeting_body(meeting: str, steps: int = 4):
+    return f"**{meeting}**\n" + "\n".join(f"{number}. {section_body(meeting, 25)}" for number in range(1, steps + 1))
+
+def mock_response(messages: list):
+    system, user = messages[0]["content"], messages[-1]["content"]
+    if "Verifikator" in system:
+        return "<validation_success>Semua input valid dan selaras dengan katalog.</validation_success>"
+
+    match = re.search(r"Section to write:\n\*\*(.+?)\*\*", user)
+    if match:
+        return section_body(match.group(1))
+
+    match = re.search(r"Pertemuan to write: \*\*(.+?)\*\*", user)
+    if match:
+        return meeting_body(match.group(1))
+
+    match = re.search(r"Tuliskan bagian (.+)\.\s*$", user)
+    if match:
+        return "\n\n".join(f"**{title}**\n\n{section_body(title)}" for title in re.findall(r"\*\*(.+?)\*\*", match.group(1)))
+
+    match = re.search(r"\*\*Pertemuan\*\*: (\d+)", user)
+    meetings = int(match.group(1)) if match else 2
+    roadmap = mock_roadmap(meetings)
+    if "Write ONLY the first three sections" in user:
+        return roadmap.split(f"**{SECTION_TITLES[3]}**")[0]
+
+    if "Write ONLY the **Kriteria Pengajaran** and **Objektif Capaian**" in user:
+        outline = "\n".join(f"Pertemuan {number}: Tema {number}" for number in range(1, meetings + 1))
+        return roadmap.split(f"**{SECTION_TITLES[2]}**")[0] + f"**{SECTION_TITLES[2]}**\n\n{outline}\n"
+
+    return roadmap
+
+
+class MockLLMServer:
+
+    # A local stand-in for the Together chat completions endpoint: streams a synthetic answer at tokens_per_second after
+    # latency seconds, honours max_tokens with finish_reason "length", and rejects error_rate of the requests with a 429
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.5, jitter: float = 0.2, tokens_per_second: float = 100.,
+                 error_rate: float = 0., retry_after: float = 1., seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "errors": 0, "completion_tokens": 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-llm", daemon=True)
+        self.thread.start()
+        logging.info(f"Mock LLM server listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, **deltas):
+        with self.lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+
+    def _draw(self):
+        with self.lock:
+            failed = self.random.random() < self.error_rate
+            delay = self.latency * (1 + self.random.uniform(-self.jitter, self.jitter))
+
+        return failed, max(delay, 0.)
+
+    def completion(self, payload: dict):
+        messages = payload["messages"]
+        if messages[-1]["content"] == CONTINUE_PROMPT:
+            # A continuation carries on from the partial answer the client sent back
+            text = mock_response(messages[:-2])[len(messages[-2]["content"]):]
+        else:
+            text = mock_response(messages)
+
+        tokens = TOKEN_PATTERN.findall(text)
+        finish_reason = "stop"
+        if len(tokens) > payload.get("max_tokens", len(tokens)):
+            tokens, finish_reason = tokens[:payload["max_tokens"]], "length"
+
+        usage = {"prompt_tokens": sum(count_tokens(message["content"]) for message in messages), "completion_tokens": len(tokens)}
+        return tokens, finish_reason, usage
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status: int, body: dict, headers: dict = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_chunk(self, data: str):
+                data = data.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server._count(requests=1)
+                failed, delay = server._draw()
+                if failed:
+                    server._count(errors=1)
+                    self.send_json(429, {"error": {"message": "Rate limit exceeded (mock)"}}, {"Retry-After": str(server.retry_after)})
+                    return
+
+                tokens, finish_reason, usage = server.completion(payload)
+                server._count(completion_tokens=len(tokens))
+                time.sleep(delay)
+
+                if not payload.get("stream"):
+                    time.sleep(len(tokens) / server.tokens_per_second)
+                    self.send_json(200, {"choices": [{"message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": finish_reason}],
+                                         "usage": usage})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                per_chunk = max(1, round(server.tokens_per_second * CHUNK_INTERVAL))
+                try:
+                    for start in range(0, len(tokens), per_chunk):
+                        content = "".join(tokens[start:start + per_chunk])
+                        self.send_chunk("data: " + json.dumps({"choices": [{"delta": {"content": content}, "finish_reason": None}]}) + "\n\n")
+                        time.sleep(len(tokens[start:start + per_chunk]) / server.tokens_per_second)
+
+                    self.send_chunk("data: " + json.dumps({"choices": [{"delta": {}, "finish_reason": finish_reason}], "usage": usage}) + "\n\n")
+                    self.send_chunk("data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled the stream, e.g. a discarded speculative generation
+                    self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the mock Together server on its own, e.g. as [local] base_url for a manual app run")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before the first token")
+    parser.add_argument("--tps", type=float, default=100., help="Tokens per second per stream")
+    parser.add_argument("--error-rate", type=float, default=0., help="Fraction of requests answered with a 429")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    server = MockLLMServer(args.host, args.port, latency=args.latency, tokens_per_second=args.tps, error_rate=args.error_rate).start()
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import threading
+import time
+from pymongo.errors import OperationFailure
+from core.catalog import dict_options
+
+
+class MockCollection:
+
+    # The subset of pymongo's Collection the engine uses (find, find_one, aggregate, watch), backed by a list and an
+    # optional per-call latency standing in for the Atlas round trip
+    def __init__(self, docs: list, latency: float = 0.):
+        self.docs = docs
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.counters = {"find": 0, "find_one": 0, "aggregate": 0}
+
+    def _call(self, name: str):
+        with self.lock:
+            self.counters[name] += 1
+
+        time.sleep(self.latency)
+
+    @staticmethod
+    def _matches(doc: dict, query: dict):
+        return all(doc.get(field) == value for field, value in (query or {}).items())
+
+    @staticmethod
+    def _project(doc: dict, projection: dict):
+        if not projection:
+            return dict(doc)
+
+        return {field: doc[field] for field, include in projection.items() if include and field in doc}
+
+    def find(self, query: dict = None, projection: dict = None):
+        self._call("find")
+        return [self._project(doc, projection) for doc in self.docs if self._matches(doc, query)]
+
+    def find_one(self, query: dict = None, projection: dict = None):
+        self._call("find_one")
+        for doc in self.docs:
+            if self._matches(doc, query):
+                return self._project(doc, projection)
+
+        return None
+
+    def aggregate(self, pipeline: list):
+        # Only CATALOG_PIPELINE is ever run against the collection: group the chapters by kelas and mapel
+        self._call("aggregate")
+        groups = {}
+        for doc in sorted(self.docs, key=lambda doc: doc["_id"]):
+            groups.setdefault((doc["kelas"], doc["mapel"]), []).append({"bab": doc["bab"], "has_ringkasan": bool(doc.get("ringkasan"))})
+
+        return [{"_id": {"kelas": kelas, "mapel": mapel}, "topik": topik} for (kelas, mapel), topik in groups.items()]
+
+    def watch(self):
+        # What a standalone server answers to $changeStream, so the summary index takes its production polling fallback
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+def seed_documents(options: dict = None, words: int = 400):
+    # One summary document per catalog chapter, with a ringkasan of roughly the length of the real ones
+    docs = []
+    for kelas, mapel_options in (options or dict_options).items():
+        for mapel, topik_options in mapel_options.items():
+            for bab in topik_options:
+                sentence = f"{bab} dipelajari siswa kelas {kelas} pada mata pelajaran {mapel} melalui konsep, contoh dan latihan."
+                ringkasan = " ".join([sentence] * max(1, words // len(sentence.split())))
+                docs.append({"_id": len(docs), "kelas": kelas, "mapel": mapel, "bab": bab, "ringkasan": ringkasan})
+
+    return docs
@@ -0,0 +1,276 @@
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bench.mock_llm import MockLLMServer
+from bench.mock_mongo import MockCollection, seed_documents
+from core.agents import BackgroundStream
+from core.catalog import dict_options, dict_style, list_waktu, list_pertemuan
+from core.engine import Engine
+from core.prompts import count_tokens
+from core.verify import pre_verify
+
+
+FEEDBACK = "Tambahkan contoh kegiatan yang lebih konkret pada setiap pertemuan dan perjelas penilaian formatifnya."
+METRICS = ["ttft", "generate", "verify", "revise_ttft", "revise", "total"]
+
+
+def percentile(values: list, q: float):
+    # Nearest rank, so p99 of a small run is its slowest sample rather than an interpolation past it
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+def summarize(values: list):
+    if not values:
+        return None
+
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99),
+            "mean": statistics.fmean(values), "max": max(values), "n": len(values)}
+
+def bench_secrets(args, workdir: str, base_url: str):
+    # Same layout as secrets.toml; every store lives in a fresh directory so a run starts cold
+    secrets = {
+        "local": {"base_url": base_url, "api_key": "bench", "model": "mock", "max_connections": args.max_connections},
+        "mongo": {"username": "bench", "password": "bench", "refresh_interval": 3600},
+        "cache": {"path": os.path.join(workdir, "roadmap_cache.sqlite3")},
+        "semantic": {"path": os.path.join(workdir, "semantic_cache.sqlite3")},
+        "usage": {"path": os.path.join(workdir, "usage_ledger.sqlite3")},
+        "retrieval": {"path": os.path.join(workdir, "retrieval_index")},
+        "catalog": {"snapshot_path": os.path.join(workdir, "catalog_snapshot.json"), "refresh_interval": 3600},
+        "generation": {"engine": args.engine},
+        "admission": {},
+    }
+    for name in ("rate", "burst", "max_in_flight"):
+        value = getattr(args, f"admission_{name}")
+        if value is not None:
+            secrets["admission"][name] = value
+
+    return secrets
+
+def workload(args, rng: random.Random):
+    topics = [(kelas, mapel, topik) for kelas, mapel_options in dict_options.items()
+              for mapel, topik_options in mapel_options.items() for topik in topik_options]
+    for _ in range(args.sessions * args.requests):
+        kelas, mapel, topik = rng.choice(topics)
+        yield {"kelas": kelas, "mapel": mapel, "topik": topik, "style": rng.choice(list(dict_style)), "waktu": rng.choice(list_waktu),
+               "pertemuan": rng.choice(list_pertemuan), "custom": rng.random() < args.custom_ratio}
+
+def consume(roadmap_stream, started: float):
+    first = None
+    text = ""
+    for delta in roadmap_stream:
+        if first is None:
+            first = time.perf_counter() - started
+
+        text += delta
+
+    return text, first
+
+def run_flow(engine: Engine, session_id: str, job: dict, revise: bool, fresh: bool = False):
+    # Mirrors roadmap_fragment without the UI: the catalog path fetches the ringkasan, the custom path verifies while the
+    # roadmap is generated speculatively; both are then revised once with feedback
+    kelas, mapel, topik, style, waktu, pertemuan = (job[name] for name in ("kelas", "mapel", "topik", "style", "waktu", "pertemuan"))
+    style_details = dict_style[style]["Deskripsi"]
+    client = engine.client(session_id)
+    result = {"custom": job["custom"]}
+    started = time.perf_counter()
+
+    if job["custom"]:
+        topik = f"Pendalaman {topik}"
+        topik_details = f"Mempelajari {job['topik']} secara mendalam melalui contoh sehari-hari, percobaan sederhana dan latihan soal bertahap."
+        verify_results = pre_verify(mapel=mapel, topik=topik, topik_details=topik_details, options=engine.options)
+        if verify_results is not None:
+            raise RuntimeError(f"Rejected by local verification: {verify_results[:80]}")
+
+        grounded, _ = engine.ground(kelas=kelas, mapel=mapel, topik=topik, topik_details=topik_details)
+        roadmap_stream = BackgroundStream(lambda: engine.teacher(client, kelas=kelas, mapel=mapel, topik=topik, topik_details=grounded, style=style,
+                                                                 style_details=style_details, waktu=waktu, pertemuan=pertemuan))
+        try:
+            verify_results = engine.verificator(client, mapel=mapel, topik=topik, topik_details=topik_details)
+        except Exception:
+            roadmap_stream.close()
+            raise
+
+        result["verify"] = time.perf_counter() - started
+        if "<generation_error_type_" in verify_results:
+            roadmap_stream.close()
+            raise RuntimeError(f"Rejected by the verificator: {verify_results[:80]}")
+
+    else:
+        data = engine.fetch_data(kelas=kelas, mapel=mapel, topik=topik)
+        if data is None or not data["ringkasan"]:
+            raise RuntimeError(f"No ringkasan for {kelas} / {mapel} / {topik}")
+
+        roadmap_stream = engine.teacher(client, kelas=kelas, mapel=mapel, topik=topik, topik_details=data["ringkasan"], style=style,
+                                        style_details=style_details, waktu=waktu, pertemuan=pertemuan, fresh=fresh)
+
+    try:
+        roadmap, result["ttft"] = consume(roadmap_stream, started)
+    finally:
+        roadmap_stream.close()
+
+    result["generate"] = time.perf_counter() - started
+    result["tokens"] = count_tokens(roadmap)
+    if job["custom"] and roadmap_stream.complete:
+        engine.remember(kelas=kelas, mapel=mapel, topik=topik, topik_details=topik_details, style=style, waktu=waktu, pertemuan=pertemuan,
+                        roadmap=roadmap)
+
+    if revise:
+        revise_started = time.perf_counter()
+        revision_stream = engine.reviser(client, previous_roadmap=roadmap, feedback=FEEDBACK)
+        try:
+            revision, result["revise_ttft"] = consume(revision_stream, revise_started)
+        finally:
+            revision_stream.close()
+
+        result["revise"] = time.perf_counter() - revise_started
+        result["tokens"] += count_tokens(revision)
+
+    result["total"] = time.perf_counter() - started
+    return result
+
+def run_sessions(args, engine: Engine, jobs: list):
+    # Each simulated session runs its share of the jobs one after another, like a teacher clicking through the form
+    results = []
+    lock = threading.Lock()
+
+    def session(number: int):
+        rng = random.Random(args.seed + number)
+        for job in jobs[number::args.sessions]:
+            try:
+                result = run_flow(engine, f"bench-{number}", job, revise=not args.no_revise)
+            except Exception as e:
+                logging.error(f"Session {number} failed: {e}")
+                result = {"custom": job["custom"], "error": str(e)}
+
+            with lock:
+                results.append(result)
+
+            if args.think_time:
+                time.sleep(rng.uniform(0, 2 * args.think_time))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        list(executor.map(session, range(args.sessions)))
+
+    return results, time.perf_counter() - started
+
+def streamlit_overhead(args, secrets: dict, collection: MockCollection, engine: Engine, jobs: list):
+    # The same catalog generations through app.py in AppTest and directly on an engine; the difference is what the
+    # Streamlit layer adds per generation, and a rerun without generation is the cost of re-executing the script
+    from streamlit.testing.v1 import AppTest
+    from core import data
+
+    data.connect_mongodb = lambda username, password: collection
+    app_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+    ui, direct, reruns = [], [], []
+
+    for job in [job for job in jobs if not job["custom"]][:args.streamlit_runs]:
+        at = AppTest.from_file(app_path, default_timeout=120)
+        for section, values in secrets.items():
+            at.secrets[section] = values
+
+        at.run()
+        started = time.perf_counter()
+        at.run()
+        reruns.append(time.perf_counter() - started)
+
+        for key in ("kelas", "mapel", "topik", "style", "waktu", "pertemuan"):
+            at.selectbox(key=f"{key}_select").select(job[key]).run()
+
+        at.button(key="lock_button").click().run()
+        generate = [button for button in at.button if button.label == "Generate Roadmap"][0]
+        started = time.perf_counter()
+        generate.click().run()
+        ui.append(time.perf_counter() - started)
+        if at.exception or at.session_state.state_gen != "second":
+            logging.error(f"Streamlit run for {job['topik']} did not finish: {at.exception}")
+
+        # fresh skips the roadmap cache, which the load test has already filled with these jobs
+        direct.append(run_flow(engine, "bench-direct", {**job, "custom": False}, revise=False, fresh=True)["total"])
+
+    return {"ui": summarize(ui), "direct": summarize(direct), "rerun": summarize(reruns),
+            "overhead_p50": percentile(ui, 50) - percentile(direct, 50) if ui else None}
+
+def report(results: list, wall: float, extra: dict):
+    completed = [result for result in results if "error" not in result]
+    summary = {
+        "sessions": len(results),
+        "completed": len(completed),
+        "errors": len(results) - len(completed),
+        "wall": wall,
+        "throughput": len(completed) / wall if wall else 0.,
+        "tokens_per_second": sum(result["tokens"] for result in completed) / wall if wall else 0.,
+        "latency": {metric: summarize([result[metric] for result in completed if result.get(metric) is not None]) for metric in METRICS},
+        **extra,
+    }
+
+    print(f"\n{summary['completed']}/{summary['sessions']} flows completed in {wall:.1f}s "
+          f"({summary['throughput']:.2f} flows/s, {summary['tokens_per_second']:.0f} tokens/s, {summary['errors']} errors)")
+    print(f"{'seconds':<12}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'n':>6}")
+    for metric, stats in summary["latency"].items():
+        if stats:
+            print(f"{metric:<12}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['p99']:>9.2f}{stats['max']:>9.2f}{stats['n']:>6}")
+
+    streamlit = extra.get("streamlit")
+    if streamlit and streamlit["ui"]:
+        print(f"Streamlit: generation p50 {streamlit['ui']['p50']:.2f}s through app.py vs {streamlit['direct']['p50']:.2f}s on the engine "
+              f"(overhead {streamlit['overhead_p50']:.2f}s), rerun p50 {streamlit['rerun']['p50'] * 1000:.0f}ms")
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency and throughput of the generation engine against a mock Together server and mock Mongo")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent simulated sessions")
+    parser.add_argument("--requests", type=int, default=2, help="Flows per session")
+    parser.add_argument("--custom-ratio", type=float, default=0.5, help="Fraction of flows with a custom topic (verified) instead of a catalog topic")
+    parser.add_argument("--no-revise", action="store_true", help="Skip the revision after every generation")
+    parser.add_argument("--think-time", type=float, default=0., help="Mean pause in seconds between the flows of one session")
+    parser.add_argument("--engine", choices=["serial", "parallel", "chunked"], default="serial")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock server seconds before the first token")
+    parser.add_argument("--tps", type=float, default=100., help="Mock server tokens per second per stream")
+    parser.add_argument("--error-rate", type=float, default=0., help="Fraction of mock server requests answered with a 429")
+    parser.add_argument("--mongo-latency", type=float, default=0.05, help="Mock Mongo seconds per call")
+    parser.add_argument("--admission-rate", type=float, help="Override [admission] rate (requests per second)")
+    parser.add_argument("--admission-burst", type=int, help="Override [admission] burst")
+    parser.add_argument("--admission-max-in-flight", type=int, help="Override [admission] max_in_flight")
+    parser.add_argument("--max-connections", type=int, default=64)
+    parser.add_argument("--streamlit-runs", type=int, default=0, help="Also time this many generations through app.py in AppTest")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the summary as JSON to this path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+    server = MockLLMServer(latency=args.latency, tokens_per_second=args.tps, error_rate=args.error_rate, seed=args.seed).start()
+    collection = MockCollection(seed_documents(), latency=args.mongo_latency)
+    jobs = list(workload(args, random.Random(args.seed)))
+
+    with tempfile.TemporaryDirectory(prefix="edumapper-bench-") as workdir:
+        engine = Engine(bench_secrets(args, workdir, server.base_url), cursor=collection).start()
+        engine.summary_index.loaded.wait(30)
+        results, wall = run_sessions(args, engine, jobs)
+        extra = {"server": server.stats(), "mongo": collection.stats(), "engine": engine.stats()}
+
+        if args.streamlit_runs:
+            ui_workdir = os.path.join(workdir, "streamlit")
+            os.makedirs(ui_workdir)
+            extra["streamlit"] = streamlit_overhead(args, bench_secrets(args, ui_workdir, server.base_url), collection, engine, jobs)
+
+    summary = report(results, wall, extra)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
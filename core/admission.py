@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from types import SimpleNamespace
+
+
+RETRYABLE_STATUS_CODES = (429, 503)
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        # Returns 0 when a token was taken, otherwise how long to wait for the next one
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.
+
+        return (1 - self.tokens) / self.rate
+
+    def drain(self, seconds: float):
+        self._refill()
+        self.tokens = min(self.tokens, 0.) - seconds * self.rate
+
+
+class AdmissionController:
+
+    def __init__(self, rate: float = 2., burst: int = 5, max_in_flight: int = 16, max_retries: int = 4,
+                 base_delay: float = 1., max_delay: float = 30.):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.queues = OrderedDict()
+        self.condition = threading.Condition()
+        self.counters = {"admitted": 0, "retries": 0, "rate_limited": 0, "peak_queued": 0}
+
+    def _position(self, session_id, ticket):
+        # Sessions are served round-robin, so a session is behind one request of every session queued ahead of it
+        for position, (queued_session, tickets) in enumerate(self.queues.items()):
+            if queued_session == session_id:
+                return position + tickets.index(ticket) + 1
+
+    def _remove(self, session_id, ticket):
+        tickets = self.queues.get(session_id)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del self.queues[session_id]
+
+        self.condition.notify_all()
+
+    def acquire(self, session_id: str, on_position=None, cancelled: threading.Event = None):
+        # Returns True once admitted, or False if cancelled was set while queued
+        ticket = object()
+        with self.condition:
+            self.queues.setdefault(session_id, deque()).append(ticket)
+            self.counters["peak_queued"] = max(self.counters["peak_queued"], sum(len(tickets) for tickets in self.queues.values()))
+            reported = None
+            try:
+                while True:
+                    if cancelled is not None and cancelled.is_set():
+                        self._remove(session_id, ticket)
+                        return False
+
+                    wait = 1.
+                    head_session, head_tickets = next(iter(self.queues.items()))
+                    if head_tickets[0] is ticket and self.in_flight < self.max_in_flight:
+                        wait = self.bucket.take()
+                        if wait == 0:
+                            head_tickets.popleft()
+                            if head_tickets:
+                                self.queues.move_to_end(head_session)
+                            else:
+                                del self.queues[head_session]
+
+                            self.in_flight += 1
+                            self.counters["admitted"] += 1
+                            self.condition.notify_all()
+                            return True
+
+                    position = self._position(session_id, ticket)
+                    if on_position is not None and position != reported:
+                        reported = position
+                        on_position(position)
+
+                    self.condition.wait(wait)
+
+            except BaseException:
+                # A cancelled wait (for example a Streamlit rerun) must not leave a dead ticket at the head of the queue
+                self._remove(session_id, ticket)
+                raise
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def backoff(self, attempt: int, error: Exception):
+        delay = getattr(error, "retry_after", None) or min(self.max_delay, self.base_delay * 2 ** attempt)
+        delay *= random.uniform(0.5, 1.5)
+        with self.condition:
+            self.counters["retries"] += 1
+            if getattr(error, "status_code", None) == 429:
+                # Provider pushback slows every session down, not just the one that was rejected
+                self.counters["rate_limited"] += 1
+                self.bucket.drain(delay)
+
+        logging.warning(f"LLM request rejected ({error}), retrying in {delay:.1f}s")
+        return delay
+
+    def stats(self):
+        with self.condition:
+            return {**self.counters, "in_flight": self.in_flight, "queued": sum(len(tickets) for tickets in self.queues.values())}
+
+
+def is_retryable(error: Exception):
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+class AdmittedStream:
+
+    def __init__(self, response, first, controller: AdmissionController):
+        self.response = response
+        self.first = first
+        # The slot is also released if the stream is dropped without being read or closed, e.g. by a Streamlit rerun
+        self.finalizer = weakref.finalize(self, controller.release)
+
+    def _release(self):
+        self.finalizer()
+
+    def __iter__(self):
+        try:
+            if self.first is not None:
+                yield self.first
+
+            yield from self.response
+        finally:
+            self._release()
+
+    def close(self):
+        close = getattr(self.response, "close", None)
+        if close is not None:
+            close()
+
+        self._release()
+
+
+class AdmittedClient:
+
+    def __init__(self, client, controller: AdmissionController, session_id: str, on_position=None, teacher: str = None):
+        self.client = client
+        self.controller = controller
+        self.session_id = session_id
+        # Who the usage is charged to and limited by; None leaves the call outside every quota
+        self.teacher = teacher
+        self.on_position = on_position
+        self.owner = threading.current_thread()
+        self.waits = threading.local()
+        self.chat = SimpleNamespace(completions=self)
+
+    def waited(self):
+        # Seconds the last create() on this thread spent queued or backing off before it was admitted
+        return getattr(self.waits, "seconds", 0.)
+
+    def _on_position(self):
+        # Queue positions are only reported on the thread that created the client; worker threads may not touch the UI
+        return self.on_position if threading.current_thread() is self.owner else None
+
+    def create(self, stream: bool = False, **params):
+        self.waits.seconds = 0.
+        for attempt in range(self.controller.max_retries + 1):
+            queued = time.perf_counter()
+            self.controller.acquire(self.session_id, self._on_position())
+            self.waits.seconds += time.perf_counter() - queued
+            try:
+                response = self.client.chat.completions.create(stream=stream, **params)
+                if not stream:
+                    self.controller.release()
+                    return response
+
+                # Pulling the first chunk surfaces a 429 here, where it can still be retried
+                return AdmittedStream(response, next(iter(response), None), self.controller)
+
+            except BaseException as e:
+                self.controller.release()
+                if not isinstance(e, Exception) or not is_retryable(e) or attempt == self.controller.max_retries:
+                    raise
+
+                delay = self.controller.backoff(attempt, e)
+                self.waits.seconds += delay
+                time.sleep(delay)
+
+    async def _acquire(self):
+        # The queue is waited on in a worker thread, which a cancelled task cannot interrupt: the thread is asked to leave
+        # the queue instead, and a slot it took before noticing is handed back
+        cancelled = threading.Event()
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self.controller.acquire, self.session_id, cancelled=cancelled))
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            cancelled.set()
+            self.controller.wake()
+            acquiring.add_done_callback(lambda task: not task.cancelled() and task.exception() is None and task.result() and self.controller.release())
+            raise
+
+    async def acreate(self, **params):
+        if params.get("stream"):
+            raise ValueError("Streaming requests are admitted through create(), which holds the slot until the stream closes")
+
+        for attempt in range(self.controller.max_retries + 1):
+            await self._acquire()
+            try:
+                return await self.client.chat.completions.acreate(**params)
+
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.controller.max_retries:
+                    raise
+
+                await asyncio.sleep(self.controller.backoff(attempt, e))
+
+            finally:
+                self.controller.release()
@@ -0,0 +1,721 @@
+import functools
+import logging
+import threading
+from core.cache import RoadmapCache
+from core.prompts import (CONTINUE_PROMPT, MIN_REVISION_TOKENS, PARALLEL_SECTIONS, meeting_messages, outline_messages, plan_messages,
+                          reviser_max_tokens, reviser_messages, section_messages, section_reviser_messages, teacher_max_tokens, teacher_messages,
+                          verificator_messages)
+from core.verify import VerdictCache
+from core.roadmap import (FEEDBACK_REJECTED, is_heading, is_meeting_heading, is_meeting_title, meeting_count, parse_outline, revised_section,
+                          splice_sections, split_sections, target_sections)
+
+
+LLM_PARAMS = {"model": "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free", "temperature": 1., "max_tokens": 3256}
+VERIFICATOR_MAX_TOKENS = 1024
+VERIFICATOR_TEMPERATURE = 0.5
+SECTION_MAX_TOKENS = 768
+MEETING_MAX_TOKENS = 1024
+MAX_CONTINUATIONS = 2
+CHUNKED_MIN_PERTEMUAN = 3
+
+
+class RoadmapStream:
+
+    def __init__(self, response, on_complete=None):
+        self.response = response
+        self.on_complete = on_complete
+        self.text = ""
+        self.finish_reason = None
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            for chunk in self.response:
+                if not chunk.choices:
+                    continue
+
+                choice = chunk.choices[0]
+                delta = choice.delta.content if choice.delta else None
+                if delta:
+                    self.text += delta
+                    yield delta
+
+                if choice.finish_reason:
+                    self.finish_reason = choice.finish_reason
+
+            if self.complete and self.on_complete is not None:
+                self.on_complete(self.text)
+        finally:
+            self.close()
+
+    @property
+    def complete(self):
+        # Together reports "stop" or "eos" on a natural end and "length" when max_tokens cut the roadmap short
+        return self.finish_reason is not None and self.finish_reason != "length"
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.closed = True
+        close = getattr(self.response, "close", None)
+        if close is not None:
+            close()
+
+
+class SectionRevisionStream:
+
+    def __init__(self, response: RoadmapStream, previous_roadmap: str, targets: list):
+        self.response = response
+        self.targets = targets
+        self.preamble, self.sections = split_sections(previous_roadmap)
+        self.revised = {}
+        self.feedback_rejected = False
+        self.text = ""
+
+    def _flush(self, final: bool):
+        # Sections are emitted in document order; a targeted one waits until its revision is complete
+        out = ""
+        while self.sections:
+            title, raw = self.sections[0]
+            if title in self.targets:
+                if title in self.revised:
+                    raw = revised_section(title, self.revised[title], raw)
+                elif not final and not self.feedback_rejected:
+                    break
+                elif not self.feedback_rejected:
+                    logging.warning(f"Revision did not return section {title}, keeping the previous one")
+
+            out += raw
+            self.sections.pop(0)
+
+        self.text += out
+        return out
+
+    def _collect(self, revision: str, final: bool):
+        if FEEDBACK_REJECTED in revision:
+            # Invalid feedback leaves the roadmap as it was
+            self.feedback_rejected = True
+            return
+
+        _, revised = split_sections(revision)
+        if not final:
+            # The last parsed section may still be streaming
+            revised = revised[:-1]
+        elif not revised and len(self.targets) == 1 and revision.strip():
+            revised = [(self.targets[0], f"**{self.targets[0]}**\n\n{revision.strip()}")]
+
+        for title, raw in revised:
+            if title in self.targets:
+                self.revised[title] = raw
+
+    def __iter__(self):
+        try:
+            out = self.preamble + self._flush(final=False)
+            self.text = out
+            if out:
+                yield out
+
+            revision = ""
+            for delta in self.response:
+                revision += delta
+                if "\n" in delta:
+                    self._collect(revision, final=False)
+                    out = self._flush(final=False)
+                    if out:
+                        yield out
+
+            self._collect(revision, final=True)
+            out = self._flush(final=True)
+            if out:
+                yield out
+        finally:
+            self.close()
+
+    @property
+    def finish_reason(self):
+        return self.response.finish_reason
+
+    @property
+    def complete(self):
+        return self.response.complete
+
+    def close(self):
+        self.response.close()
+
+
+class ContinuedStream:
+
+    def __init__(self, _client, messages: list, llm_params: dict, max_tokens: int = None, max_continuations: int = MAX_CONTINUATIONS, on_complete=None):
+        self.client = _client
+        self.messages = messages
+        self.llm_params = llm_params
+        self.max_tokens = max_tokens or llm_params["max_tokens"]
+        self.max_continuations = max_continuations
+        self.on_complete = on_complete
+        self.continuations = 0
+        self.text = ""
+        self.finish_reason = None
+        self.closed = False
+        self.stream = self._request(messages)
+
+    def _request(self, messages: list):
+        response = self.client.chat.completions.create(model=self.llm_params["model"], max_tokens=self.max_tokens,
+                                                        temperature=self.llm_params["temperature"], messages=messages, stream=True)
+        return RoadmapStream(response)
+
+    def __iter__(self):
+        try:
+            while True:
+                for delta in self.stream:
+                    self.text += delta
+                    yield delta
+
+                self.finish_reason = self.stream.finish_reason
+                if self.finish_reason != "length" or self.continuations >= self.max_continuations:
+                    break
+
+                # Cut off by max_tokens: the model carries on from its own partial answer instead of leaving it truncated
+                self.continuations += 1
+                logging.info(f"Output cut off at max_tokens, requesting continuation {self.continuations}")
+                self.stream = self._request(self.messages + [{"role": "assistant", "content": self.text},
+                                                             {"role": "user", "content": CONTINUE_PROMPT}])
+
+            if self.complete and self.on_complete is not None:
+                self.on_complete(self.text)
+        finally:
+            self.close()
+
+    @property
+    def complete(self):
+        return self.finish_reason is not None and self.finish_reason != "length"
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.closed = True
+        self.stream.close()
+
+
+class CachedRoadmap:
+
+    def __init__(self, text: str):
+        self.text = text
+        self.finish_reason = "stop"
+        self.complete = True
+
+    def __iter__(self):
+        yield self.text
+
+    def close(self):
+        pass
+
+
+class BackgroundStream:
+
+    def __init__(self, start_stream=None, on_finish=None):
+        self.chunks = []
+        self.text = ""
+        self.finish_reason = None
+        self.error = None
+        self.finished = False
+        self.on_finish = on_finish
+        self.cancelled = threading.Event()
+        self.condition = threading.Condition()
+        self.thread = None
+        if start_stream is not None:
+            self.start(start_stream)
+
+    def start(self, start_stream):
+        self.thread = threading.Thread(target=self._run, args=(start_stream,), daemon=True)
+        self.thread.start()
+
+    def _run(self, start_stream):
+        roadmap_stream = None
+        try:
+            # Closed before it started, e.g. a section still queued when the roadmap was cancelled: nothing is requested
+            if self.cancelled.is_set():
+                return
+
+            roadmap_stream = start_stream()
+            for delta in roadmap_stream:
+                if self.cancelled.is_set():
+                    break
+
+                with self.condition:
+                    self.chunks.append(delta)
+                    self.text += delta
+                    self.condition.notify_all()
+
+            self.finish_reason = roadmap_stream.finish_reason
+
+        except Exception as e:
+            logging.error("Background roadmap generation failed")
+            logging.error(e)
+            self.error = e
+
+        finally:
+            if roadmap_stream is not None:
+                roadmap_stream.close()
+
+            self._finish()
+
+    def _finish(self):
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+        if self.on_finish is not None:
+            self.on_finish()
+
+    def fail(self, error: Exception):
+        self.error = error
+        self._finish()
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self.condition:
+                while index >= len(self.chunks) and not self.finished:
+                    self.condition.wait()
+
+                if index >= len(self.chunks):
+                    break
+
+                delta = self.chunks[index]
+
+            index += 1
+            yield delta
+
+        if self.error is not None:
+            raise self.error
+
+    @property
+    def complete(self):
+        return not self.cancelled.is_set() and self.finish_reason is not None and self.finish_reason != "length"
+
+    def close(self):
+        # The worker thread notices the flag on its next chunk and closes the upstream response itself;
+        # closing a stream that already finished leaves it complete
+        with self.condition:
+            if not self.finished:
+                self.cancelled.set()
+
+
+class FlightStream:
+
+    def __init__(self, flights, key: str, flight: BackgroundStream):
+        self.flights = flights
+        self.key = key
+        self.flight = flight
+        self.text = ""
+        self.finish_reason = None
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            # Every follower replays the shared buffer from the first chunk, so late joiners still get the whole roadmap
+            for delta in self.flight:
+                if self.closed:
+                    return
+
+                self.text += delta
+                yield delta
+
+            self.finish_reason = self.flight.finish_reason
+        finally:
+            self.close()
+
+    @property
+    def complete(self):
+        return self.finish_reason is not None and self.finish_reason != "length"
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.closed = True
+        self.flights.leave(self.key, self.flight)
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self.flights = {}
+        self.followers = {}
+        self.lock = threading.Lock()
+        self.counters = {"upstream": 0, "joined": 0}
+
+    @staticmethod
+    def key(messages: list, llm_params: dict):
+        # The same key as the roadmap cache: only requests with the identical prompt may share one generation
+        return RoadmapCache.key(messages, llm_params)
+
+    def join(self, key: str, start_stream):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = BackgroundStream(on_finish=lambda: self._finish(key, flight))
+                self.flights[key] = flight
+                self.counters["upstream"] += 1
+            else:
+                self.counters["joined"] += 1
+
+            self.followers[flight] = self.followers.get(flight, 0) + 1
+
+        if not leader:
+            logging.info("Roadmap attached to an in-flight generation")
+            return FlightStream(self, key, flight)
+
+        # The leader opens the upstream stream on its own thread, so queueing and errors surface where it is waiting
+        try:
+            roadmap_stream = start_stream()
+        except BaseException as e:
+            flight.fail(e)
+            self.leave(key, flight)
+            raise
+
+        flight.start(lambda: roadmap_stream)
+        return FlightStream(self, key, flight)
+
+    def _finish(self, key: str, flight: BackgroundStream):
+        with self.lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+    def leave(self, key: str, flight: BackgroundStream):
+        with self.lock:
+            self.followers[flight] -= 1
+            if self.followers[flight] > 0:
+                return
+
+            del self.followers[flight]
+            abandoned = not flight.finished
+            if abandoned and self.flights.get(key) is flight:
+                del self.flights[key]
+
+        # Upstream is only cancelled once the last follower has gone
+        if abandoned:
+            flight.close()
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "in_flight": len(self.flights)}
+
+
+class ParallelRoadmapStream:
+
+    def __init__(self, _client, kelas: str, mapel: str, topik: str, topik_details:str, style: str, style_details:str, waktu: str, pertemuan: str,
+                 llm_params: dict, on_complete=None, cache: RoadmapCache = None, fresh: bool = False):
+        self.client = _client
+        self.inputs = {"kelas": kelas, "mapel": mapel, "topik": topik, "style": style, "style_details": style_details, "waktu": waktu, "pertemuan": pertemuan}
+        self.topik_details = topik_details
+        self.llm_params = llm_params
+        self.on_complete = on_complete
+        self.cache = cache
+        self.fresh = fresh
+        self.workers = []
+        self.text = ""
+        self.finish_reason = None
+        self.cut_off = False
+        self.missing = []
+        self.closed = False
+
+        # The plan is requested here, on the caller's thread, like a regular agent_teacher stream
+        self.plan = ContinuedStream(_client, self._plan_messages(), llm_params, max_tokens=teacher_max_tokens(waktu, pertemuan))
+
+    def _plan_messages(self):
+        return plan_messages(topik_details=self.topik_details, **self.inputs)
+
+    def _start_section(self, title: str, plan: str):
+        return ContinuedStream(self.client, section_messages(title=title, plan=plan, **self.inputs), self.llm_params,
+                               max_tokens=min(SECTION_MAX_TOKENS, self.llm_params["max_tokens"]))
+
+    def _parts(self, plan: str):
+        # (heading written before the part, its stream, a check for a repeated heading the model may start with, where the part must end)
+        return [(f"**{title}**\n\n", BackgroundStream(functools.partial(self._start_section, title, plan)), functools.partial(is_heading, titles=[title]), is_heading)
+                for title in PARALLEL_SECTIONS]
+
+    def _lines(self, stream, stop, skip=None, hide=None):
+        # Text is passed on line by line so a section this call was not asked for is cut off before it is shown
+        self.cut_off = False
+        buffer = ""
+        leading = True
+        hidden = False
+        for delta in stream:
+            buffer += delta
+            while "\n" in buffer:
+                line, buffer = buffer.split("\n", 1)
+                if leading and skip is not None and skip(line):
+                    continue
+
+                if stop(line):
+                    self.cut_off = True
+                    return
+
+                hidden = hidden or (hide is not None and hide(line))
+                leading = leading and not line.strip()
+                if not hidden:
+                    yield line + "\n"
+
+        if buffer.strip() and not hidden and not stop(buffer) and not (leading and skip is not None and skip(buffer)):
+            yield buffer
+
+    def _plan_lines(self):
+        return self._lines(self.plan, stop=functools.partial(is_heading, titles=PARALLEL_SECTIONS))
+
+    def _emit(self, delta: str):
+        self.text += delta
+        return delta
+
+    def __iter__(self):
+        try:
+            for line in self._plan_lines():
+                yield self._emit(line)
+
+            if not (self.cut_off or self.plan.complete):
+                self.finish_reason = self.plan.finish_reason or "length"
+                return
+
+            parts = self._parts(self.text.strip())
+            self.workers = [worker for _, worker, _, _ in parts]
+            self.finish_reason = "stop"
+            for heading, worker, skip, stop in parts:
+                trailing = len(self.text) - len(self.text.rstrip("\n"))
+                yield self._emit("\n\n"[trailing:] + heading)
+                written = False
+                for line in self._lines(worker, stop=stop, skip=skip):
+                    written = written or bool(line.strip())
+                    yield self._emit(line)
+
+                if not written:
+                    logging.warning(f"Generation returned an empty part under {heading.strip()}")
+                    self.missing.append(heading.strip())
+
+                if self.cut_off:
+                    worker.close()
+                elif not worker.complete:
+                    self.finish_reason = worker.finish_reason or "length"
+
+            if self.complete and self.on_complete is not None:
+                self.on_complete(self.text)
+        finally:
+            self.close()
+
+    @property
+    def complete(self):
+        return self.finish_reason is not None and self.finish_reason != "length" and not self.missing
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.closed = True
+        self.plan.close()
+        for worker in self.workers:
+            worker.close()
+
+
+class ChunkedRoadmapStream(ParallelRoadmapStream):
+
+    # The plan only holds the criteria, the objectives and a one-line theme per pertemuan; every pertemuan's steps are then
+    # generated as their own bounded call, concurrently with the remaining sections
+    def __init__(self, *args, **kwargs):
+        self.previous_outline = []
+        super().__init__(*args, **kwargs)
+
+    def _outline_key(self, count: int):
+        inputs = {name: value for name, value in self.inputs.items() if name != "pertemuan"}
+        return RoadmapCache.key([{"role": "user", "content": f"outline:{count}:{inputs}:{self.topik_details}"}], self.llm_params)
+
+    def _plan_messages(self):
+        # An outline cached for fewer meetings is kept as the start of this one, so its meeting chunks are cache hits
+        count = meeting_count(self.inputs["pertemuan"])
+        if self.cache is not None and not self.fresh:
+            for previous in range(count - 1, 0, -1):
+                outline = self.cache.get(self._outline_key(previous))
+                if outline is not None:
+                    self.previous_outline = outline.splitlines()
+                    break
+
+        return outline_messages(topik_details=self.topik_details, previous_outline=self.previous_outline, **self.inputs)
+
+    def _plan_lines(self):
+        return self._lines(self.plan, stop=functools.partial(is_heading, titles=PARALLEL_SECTIONS),
+                           hide=functools.partial(is_heading, titles=["Road Map Pengajaran"]))
+
+    def _outline(self):
+        count = meeting_count(self.inputs["pertemuan"])
+        themes = parse_outline(self.plan.text)
+
+        if len(themes) < count:
+            logging.warning(f"Outline has {len(themes)} of {count} pertemuan themes")
+
+        outline = [f"Pertemuan {number}: {themes.get(number, 'Lanjutan ' + self.inputs['topik'])}" for number in range(1, count + 1)]
+        if self.cache is not None and len(themes) >= count:
+            self.cache.set(self._outline_key(count), "\n".join(outline))
+
+        return outline
+
+    def _start_meeting(self, messages: list, cache_key: str):
+        return ContinuedStream(self.client, messages, self.llm_params, max_tokens=min(MEETING_MAX_TOKENS, self.llm_params["max_tokens"]),
+                               on_complete=None if self.cache is None else lambda text: self.cache.set(cache_key, text))
+
+    def _meeting_part(self, number: int, outline: list):
+        # The chunk key leaves out the total number of pertemuan: the same inputs and outline so far give the same day
+        messages = meeting_messages(number=number, outline=outline[:number], topik_details=self.topik_details,
+                                    **{name: value for name, value in self.inputs.items() if name != "pertemuan"})
+        cache_key, cached = cache_lookup(self.cache, messages, self.llm_params, self.fresh)
+        worker = CachedRoadmap(cached) if cached is not None else BackgroundStream(functools.partial(self._start_meeting, messages, cache_key))
+        heading = "**Road Map Pengajaran**\n\n" if number == 1 else ""
+        return heading + f"**{outline[number - 1]}**\n", worker, is_meeting_title, lambda line: is_heading(line) or is_meeting_heading(line)
+
+    def _parts(self, plan: str):
+        outline = self._outline()
+        meetings = [self._meeting_part(number, outline) for number in range(1, len(outline) + 1)]
+        return meetings + super()._parts(plan + "\n\n**Road Map Pengajaran**\n\n" + "\n".join(outline))
+
+
+ENGINES = {"parallel": ParallelRoadmapStream, "chunked": ChunkedRoadmapStream}
+
+def cache_lookup(cache: RoadmapCache, messages: list, llm_params: dict, fresh: bool):
+    # fresh=True skips the lookup (Regenerate asks for a new variation) but the caller still stores the result
+    if cache is None:
+        return None, None
+
+    cache_key = cache.key(messages, llm_params)
+    cached = None if fresh else cache.get(cache_key)
+    if cached is not None:
+        logging.info("Roadmap served from cache")
+
+    return cache_key, cached
+
+def agent_teacher(_client, kelas: str, mapel: str, topik: str, topik_details:str, style: str, style_details:str, waktu: str, pertemuan: str, llm_params: dict,
+                  stream: bool = False, cache: RoadmapCache = None, fresh: bool = False, flights: SingleFlight = None, engine: str = "serial"):
+
+    messages = teacher_messages(kelas=kelas, mapel=mapel, topik=topik, topik_details=topik_details, style=style,
+                                style_details=style_details, waktu=waktu, pertemuan=pertemuan)
+
+    # Every engine shares the cache key, so pre-generated roadmaps are served whichever engine is enabled
+    cache_key, cached = cache_lookup(cache, messages, llm_params, fresh)
+    if cached is not None:
+        return CachedRoadmap(cached) if stream else cached
+
+    on_complete = None if cache is None else lambda text: cache.set(cache_key, text)
+    if engine == "auto":
+        engine = "chunked" if meeting_count(pertemuan) >= CHUNKED_MIN_PERTEMUAN else "serial"
+
+    def start_stream():
+        if engine in ENGINES:
+            return ENGINES[engine](_client, kelas=kelas, mapel=mapel, topik=topik, topik_details=topik_details, style=style, style_details=style_details,
+                                   waktu=waktu, pertemuan=pertemuan, llm_params=llm_params, on_complete=on_complete, cache=cache, fresh=fresh)
+
+        return ContinuedStream(_client, messages, llm_params, max_tokens=teacher_max_tokens(waktu, pertemuan), on_complete=on_complete)
+
+    # A fresh generation asks for a new variation, so it never attaches to one already running
+    if flights is not None and not fresh:
+        roadmap_stream = flights.join(flights.key(messages, llm_params), start_stream)
+    else:
+        roadmap_stream = start_stream()
+
+    if stream:
+        return roadmap_stream
+
+    # Without streaming the roadmap is still read from the stream, so a cut-off answer is continued and only a complete
+    # one is cached
+    for _ in roadmap_stream:
+        pass
+
+    return roadmap_stream.text
+
+
+def revision_request(previous_roadmap: str, feedback: str, sections: bool):
+    # Feedback aimed at a few sections only regenerates those sections; anything broader resends the whole roadmap.
+    # The output reservation follows the size of what is rewritten
+    targets = target_sections(previous_roadmap, feedback) if sections else None
+    if targets is None:
+        return None, reviser_messages(previous_roadmap=previous_roadmap, feedback=feedback), reviser_max_tokens(previous_roadmap)
+
+    logging.info(f"Revising sections {targets}")
+    targeted = "".join(raw for title, raw in split_sections(previous_roadmap)[1] if title in targets)
+    return (targets, section_reviser_messages(previous_roadmap=previous_roadmap, feedback=feedback, targets=targets),
+            reviser_max_tokens(targeted, minimum=MIN_REVISION_TOKENS))
+
+def agent_reviser(_client, previous_roadmap:str, feedback: str, llm_params: dict, stream: bool = False, sections: bool = True):
+
+    targets, messages, max_tokens = revision_request(previous_roadmap, feedback, sections)
+    response = _client.chat.completions.create(model=llm_params["model"], max_tokens=max_tokens,
+                                                temperature=llm_params["temperature"], messages=messages, stream=stream)
+    if stream:
+        if targets is not None:
+            return SectionRevisionStream(RoadmapStream(response), previous_roadmap, targets)
+
+        return RoadmapStream(response)
+
+    if targets is not None:
+        return splice_sections(previous_roadmap, response.choices[0].message.content, targets)
+
+    return response.choices[0].message.content
+
+def agent_verificator(_client, mapel:str, topik: str, topik_details: str, llm_params: dict, verdicts: VerdictCache = None):
+    if verdicts is not None:
+        verdict_key = verdicts.key(mapel, topik, topik_details, llm_params["model"])
+        verdict = verdicts.get(verdict_key)
+        if verdict is not None:
+            logging.info("Verification verdict served from cache")
+            return verdict
+
+    messages = verificator_messages(mapel=mapel, topik=topik, topik_details=topik_details)
+    response = _client.chat.completions.create(model=llm_params["model"], max_tokens=VERIFICATOR_MAX_TOKENS,
+                                                temperature=VERIFICATOR_TEMPERATURE, messages=messages)
+    
+    verdict = response.choices[0].message.content
+    if verdicts is not None:
+        verdicts.set(verdict_key, verdict)
+
+    return verdict
+
+
+async def agent_teacher_async(_client, kelas: str, mapel: str, topik: str, topik_details:str, style: str, style_details:str, waktu: str,
+                              pertemuan: str, llm_params: dict, cache: RoadmapCache = None, fresh: bool = False):
+
+    messages = teacher_messages(kelas=kelas, mapel=mapel, topik=topik, topik_details=topik_details, style=style,
+                                style_details=style_details, waktu=waktu, pertemuan=pertemuan)
+    cache_key, cached = cache_lookup(cache, messages, llm_params, fresh)
+    if cached is not None:
+        return cached
+
+    response = await _client.chat.completions.acreate(model=llm_params["model"], max_tokens=teacher_max_tokens(waktu, pertemuan),
+                                                       temperature=llm_params["temperature"], messages=messages)
+    roadmap = response.choices[0].message.content
+    if cache is not None and response.choices[0].finish_reason != "length":
+        cache.set(cache_key, roadmap)
+
+    return roadmap
+
+async def agent_reviser_async(_client, previous_roadmap:str, feedback: str, llm_params: dict, sections: bool = True):
+    targets, messages, max_tokens = revision_request(previous_roadmap, feedback, sections)
+    response = await _client.chat.completions.acreate(model=llm_params["model"], max_tokens=max_tokens,
+                                                       temperature=llm_params["temperature"], messages=messages)
+    if targets is not None:
+        return splice_sections(previous_roadmap, response.choices[0].message.content, targets)
+
+    return response.choices[0].message.content
+
+async def agent_verificator_async(_client, mapel:str, topik: str, topik_details: str, llm_params: dict, verdicts: VerdictCache = None):
+    if verdicts is not None:
+        verdict_key = verdicts.key(mapel, topik, topik_details, llm_params["model"])
+        verdict = verdicts.get(verdict_key)
+        if verdict is not None:
+            return verdict
+
+    response = await _client.chat.completions.acreate(model=llm_params["model"], max_tokens=VERIFICATOR_MAX_TOKENS,
+                                                       temperature=VERIFICATOR_TEMPERATURE,
+                                                       messages=verificator_messages(mapel=mapel, topik=topik, topik_details=topik_details))
+    verdict = response.choices[0].message.content
+    if verdicts is not None:
+        verdicts.set(verdict_key, verdict)
+
+    return verdict
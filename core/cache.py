@@ -0,0 +1,79 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+
+class RoadmapCache:
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, max_entries: int = 5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS roadmaps (
+                key TEXT PRIMARY KEY,
+                roadmap TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                expires_at REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS roadmaps_accessed_at ON roadmaps (accessed_at)")
+        logging.info(f"Roadmap cache opened at {path}")
+
+    @staticmethod
+    def key(messages: list, llm_params: dict):
+        payload = json.dumps({"messages": messages, "llm_params": llm_params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT roadmap FROM roadmaps WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                                    (key, now)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.conn.execute("UPDATE roadmaps SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, roadmap: str, expires: bool = True):
+        # Pre-generated entries are stored with expires=False; they never expire and are not counted against max_entries.
+        # An expiring write (e.g. a fresh Regenerate) never replaces a pre-generated entry
+        now = time.time()
+        expires_at = now + self.ttl if expires else None
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO roadmaps (key, roadmap, created_at, accessed_at, expires_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET roadmap = excluded.roadmap, created_at = excluded.created_at,
+                                                accessed_at = excluded.accessed_at, expires_at = excluded.expires_at
+                WHERE roadmaps.expires_at IS NOT NULL OR excluded.expires_at IS NULL
+            """, (key, roadmap, now, now, expires_at))
+            self.conn.execute("DELETE FROM roadmaps WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            self.conn.execute("""
+                DELETE FROM roadmaps WHERE key IN (
+                    SELECT key FROM roadmaps WHERE expires_at IS NOT NULL ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def __contains__(self, key: str):
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM roadmaps WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                                    (key, time.time())).fetchone()
+        return row is not None
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM roadmaps").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+dict_options = {
+    "7": {
+        "IPA": ["Hakikat Ilmu Sains dan Metode Ilmiah", "Zat dan Perubahannya", "Suhu, Kalor, dan Pemuaian", "Gerak dan Gaya",
+        "Klasifikasi Makhluk Hidup","Ekologi dan Keanekaragaman Hayati Indonesia","Bumi dan Tata Surya"],
+        "IPS": ["Kehidupan Sosial dan Kondisi Lingkungan Sekitar", "Keberagaman Lingkungan Sekitar", "Potensi Ekonomi Lingkungan", "Pemberdayaan Masyarakat"],
+        "Matematika": ["Bilangan Bulat", "Aljabar Dasar", "Persamaan Linear", "Perbandingan Senilai dan Berbalik Nilai", "Bangun Datar", "Bangun Ruang", "Penggunaan Data"]
+    },
+    "8": {
+        "IPA": ["Pengenalan Sel", "Struktur dan Fungsi Makhluk Hidup", "Usaha, Energi dan Pesawat Sederhana", "Getaran, Gelombang dan Cahaya", "Unsur, Senyawa dan Campuran", "Struktur Bumi dan Perkembangannya"],
+        "IPS": ['Kondisi Geografis dan Pelestarian Sumber Daya Alam', "Kemajemukan Masyarakat Indonesia", "Nasionalisme dan Jati Diri Bangsa", "Pembangunan Perekonomian Indonesia"],
+        "Matematika": ["Penyederhanaan Bentuk Aljabar", "Sistem Persamaan Linear Dua Variabel", "Fungsi Linear", "Sifat-Sifat Bangun Geometri", "Segitiga dan Segi Empat", "Peluang Dasar"]
+    },
+    "9": {
+        "IPA": ["Pertumbuhan dan Perkembangan", "Sistem Koordinasi, Reproduksi dan Homeostatis Manusia", "Tekanan", "Listrik, Magnet dan Sumber Energi Alternatif", "Reaksi-Reaksi Kimia dan Dinamikanya",
+       "Pewarisan Sifat dan Bioteknologi", "Isu-Isu Lingkungan"],
+        "IPS": ["Manusia dan Perubahan", "Perkembangan Ekonomi Digital", "Tantangan Pembangunan Indonesia", "Tujuan Pembangunan Berkelanjutan (SDG)"],
+        "Matematika": ["Sistem Persamaan Linear Dua Variabel", "Bangun Ruang", "Transformasi Geometri", "Peluang dan Pemilihan Sampel"]
+    }
+}
+
+dict_style = {
+  "Direct Instruction Learning": {
+    "Deskripsi": "Pendekatan pembelajaran yang berpusat pada guru, di mana materi pelajaran disampaikan secara sangat terstruktur dan bertahap dengan tujuan pembelajaran yang jelas. Guru mengendalikan kecepatan dan alur informasi. Implementasinya mencakup penjelasan yang eksplisit dan terperinci, seringkali secara lisan atau tertulis yang jelas; guru memberikan contoh dan memodelkan konsep sebelum siswa berlatih; penggunaan lembar kerja, kuis, dan latihan untuk memperkuat pembelajaran; serta guru memimpin seluruh proses belajar, membimbing siswa melalui materi."
+  },
+  "Inquiry-Based Learning": {
+    "Deskripsi": "Pendekatan yang berpusat pada siswa, di mana peserta didik secara aktif mengeksplorasi pertanyaan, masalah, atau skenario untuk membangun pemahaman mereka sendiri, dengan penekanan pada proses penemuan dan berpikir kritis. Implementasinya melibatkan pengajuan pertanyaan terbuka yang merangsang keingintahuan dan investigasi; melibatkan siswa dalam eksperimen langsung, penelitian, atau kegiatan penemuan; menggunakan teknik pertanyaan Sokratik (mengajukan pertanyaan pemandu untuk merangsang pemikiran yang lebih dalam); serta penjelasan langsung yang minimal dari guru, karena siswa dibimbing untuk menemukan jawaban sendiri."
+  },
+  "Project-Based Learning": {
+    "Deskripsi": "Pedagogi yang berpusat pada siswa di mana pembelajaran terjadi melalui keterlibatan dalam proyek-proyek dunia nyata yang kompleks dan berlangsung dalam jangka waktu tertentu, yang berpuncak pada produk, presentasi, atau kinerja nyata. Implementasinya meliputi perumusan skenario masalah yang autentik atau pertanyaan pendorong; penetapan peran dan hasil kerja kolaboratif untuk tugas kelompok; penyusunan garis waktu yang jelas dengan tonggak pencapaian dan target hasil; serta penggabungan pertanyaan dan kegiatan refleksi sepanjang proyek."
+  },
+  "Flipped Classroom Learning": {
+    "Deskripsi": "Strategi instruksional di mana elemen kuliah tradisional dan pekerjaan rumah dibalik. Siswa pertama-tama mengakses konten instruksional (misalnya, video, bacaan) di luar kelas, dan waktu di kelas didedikasikan untuk pembelajaran aktif, diskusi, dan penerapan pengetahuan. Implementasinya melibatkan pemberian tugas pra-kelas seperti menonton video instruksional atau menyelesaikan daftar bacaan yang telah dikurasi; pemanfaatan waktu kelas untuk pemecahan masalah kolaboratif dan latihan penerapan; fasilitasi instruksi oleh teman sebaya dan tugas pembelajaran kolaboratif; serta penggunaan pertanyaan tinjauan aktif dan diskusi untuk memeriksa pemahaman dan memperdalam pembelajaran."
+  },
+  "Experiential Learning": {
+    "Deskripsi": "Proses belajar melalui pengalaman langsung dan refleksi, dengan fokus pada partisipasi aktif dalam kegiatan konkret dan belajar dari konsekuensi tindakan tersebut. Implementasinya mencakup penggunaan simulasi, eksperimen, permainan peran, atau kunjungan lapangan; pelaksanaan sesi refleksi terstruktur atau diskusi setelah kegiatan; penekanan pada pendekatan coba-coba di mana kesalahan adalah peluang belajar; serta perancangan kegiatan yang melibatkan berbagai indra untuk pengalaman sensorik yang kaya."
+  }
+}
+
+list_waktu = ["30 menit","45 menit","1 jam", "1,5 jam", "2 jam", "2,5 jam"]
+list_pertemuan = ["1 kali", "2 kali", "3 kali", "4 kali"]
+
+
+CATALOG_PIPELINE = [
+    {"$sort": {"_id": 1}},
+    {"$group": {
+        "_id": {"kelas": "$kelas", "mapel": "$mapel"},
+        "topik": {"$push": {"bab": "$bab", "has_ringkasan": {"$gt": [{"$strLenCP": {"$ifNull": ["$ringkasan", ""]}}, 0]}}}
+    }}
+]
+
+
+def build_options(groups: list):
+    options = {}
+    for group in groups:
+        kelas, mapel = str(group["_id"]["kelas"]), group["_id"]["mapel"]
+        topik_list = []
+        for topik in group["topik"]:
+            if not topik["bab"] or topik["bab"] in topik_list:
+                continue
+
+            # A topic without ringkasan would make fetch_data come back empty, so it is never offered
+            if not topik["has_ringkasan"]:
+                logging.warning(f"Skipping kelas {kelas} / {mapel} / {topik['bab']}: no ringkasan")
+                continue
+
+            topik_list.append(topik["bab"])
+
+        if topik_list:
+            options.setdefault(kelas, {})[mapel] = topik_list
+
+    return {kelas: dict(sorted(options[kelas].items()))
+            for kelas in sorted(options, key=lambda kelas: (not kelas.isdigit(), int(kelas) if kelas.isdigit() else kelas))}
+
+
+class Catalog:
+
+    def __init__(self, snapshot_path: str):
+        self.snapshot_path = snapshot_path
+        self.options = dict_options
+
+        try:
+            with open(snapshot_path, encoding="utf-8") as f:
+                self.options = json.load(f)
+            logging.info(f"Loaded catalog snapshot from {snapshot_path}")
+
+        except FileNotFoundError:
+            logging.info("No catalog snapshot yet, using the built-in catalog")
+
+        except Exception as e:
+            logging.error("Failed to read catalog snapshot, using the built-in catalog")
+            logging.error(e)
+
+    def refresh(self, cursor):
+        started = time.perf_counter()
+        options = build_options(list(cursor.aggregate(CATALOG_PIPELINE)))
+        if not options:
+            logging.warning("Catalog aggregation returned no topics, keeping the current catalog")
+            return
+
+        self.options = options
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(options, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.snapshot_path)
+
+        topik_count = sum(len(topik_list) for mapel_options in options.values() for topik_list in mapel_options.values())
+        logging.info(f"Catalog refreshed with {topik_count} topics in {time.perf_counter() - started:.2f}s")
+
+    def start(self, cursor, refresh_interval: float = 3600):
+        def run():
+            while True:
+                try:
+                    self.refresh(cursor)
+                except Exception as e:
+                    logging.error("Failed to refresh catalog")
+                    logging.error(e)
+
+                time.sleep(refresh_interval)
+
+        threading.Thread(target=run, daemon=True).start()
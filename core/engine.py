@@ -0,0 +1,286 @@
+import functools
+import logging
+import os
+import tomllib
+from core.admission import AdmissionController, AdmittedClient
+from core.agents import LLM_PARAMS, CachedRoadmap, SingleFlight, agent_reviser, agent_teacher, agent_verificator
+from core.cache import RoadmapCache
+from core.catalog import Catalog
+from core.ledger import UsageLedger
+from core.metrics import MeteredClient, Metrics, MetricsServer, TimedStream
+from core.resources import LazyResource
+from core.verify import VerdictCache
+
+
+def load_secrets(path: str):
+    # Same layout as .streamlit/secrets.toml, for running the engine outside Streamlit
+    secrets = {}
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            secrets = tomllib.load(f)
+
+    secrets.setdefault("together", {})
+    secrets.setdefault("mongo", {})
+    secrets["together"]["api_key"] = os.environ.get("TOGETHER_API_KEY", secrets["together"].get("api_key"))
+    secrets["mongo"]["username"] = os.environ.get("MONGO_USERNAME", secrets["mongo"].get("username"))
+    secrets["mongo"]["password"] = os.environ.get("MONGO_PASSWORD", secrets["mongo"].get("password"))
+    return secrets
+
+
+class Engine:
+
+    # Everything a generation needs, built from a secrets dict without Streamlit; pymongo, httpx and numpy are only
+    # imported when the resource that needs them is first used
+    def __init__(self, secrets: dict, cursor=None):
+        self.secrets = secrets
+        self.generation_engine = secrets.get("generation", {}).get("engine", "serial")
+        self.metrics = Metrics()
+        self.metrics_server = None
+        if cursor is not None:
+            # A ready collection, e.g. the benchmark's mock, instead of connecting to Atlas
+            self.cursor = LazyResource("MongoDB", lambda: cursor).start()
+
+    def config(self, section: str):
+        return self.secrets.get(section, {})
+
+    def start(self):
+        # Kicks off the background connections and index loads, so the first request does not pay for them
+        self.summary_index
+        self.retrieval_index
+        self.catalog
+        self.semantic_cache
+        self.llm_client
+        self.ledger
+
+        # [metrics] port serves the Prometheus endpoint; off by default
+        metrics_config = self.config("metrics")
+        if metrics_config.get("port") and self.metrics_server is None:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, self.stats, host=metrics_config.get("host", "127.0.0.1"),
+                                                    port=metrics_config["port"]).start()
+            except OSError as e:
+                logging.error(f"Metrics endpoint not started on port {metrics_config['port']}")
+                logging.error(e)
+
+        return self
+
+    @functools.cached_property
+    def cursor(self):
+        from core import data
+
+        mongo_config = self.config("mongo")
+        return LazyResource("MongoDB", functools.partial(data.connect_mongodb, mongo_config["username"], mongo_config["password"])).start()
+
+    @functools.cached_property
+    def summary_index(self):
+        from core.data import SummaryIndex
+
+        index = SummaryIndex(self.cursor, refresh_interval=self.config("mongo").get("refresh_interval", 600))
+        index.start()
+        return index
+
+    @functools.cached_property
+    def retrieval_index(self):
+        from core.retrieval import RetrievalIndex
+
+        # Updated from the summary index thread after every refresh, so only changed ringkasan are embedded again
+        retrieval_config = self.config("retrieval")
+        index = RetrievalIndex(retrieval_config.get("path", "retrieval_index"),
+                               min_similarity=retrieval_config.get("min_similarity", 0.25))
+        self.summary_index.subscribe(index.update)
+        return index
+
+    @functools.cached_property
+    def catalog(self):
+        catalog_config = self.config("catalog")
+        catalog = Catalog(catalog_config.get("snapshot_path", "catalog_snapshot.json"))
+        catalog.start(self.cursor, refresh_interval=catalog_config.get("refresh_interval", 3600))
+        return catalog
+
+    @property
+    def options(self):
+        return self.catalog.options
+
+    @functools.cached_property
+    def roadmap_cache(self):
+        cache_config = self.config("cache")
+        return RoadmapCache(cache_config.get("path", "roadmap_cache.sqlite3"),
+                            ttl=cache_config.get("ttl", 7 * 24 * 3600),
+                            max_entries=cache_config.get("max_entries", 5000))
+
+    @functools.cached_property
+    def admission(self):
+        # One controller per engine, so every session shares the same rate limit and in-flight budget
+        admission_config = self.config("admission")
+        return AdmissionController(rate=admission_config.get("rate", 2.),
+                                   burst=admission_config.get("burst", 5),
+                                   max_in_flight=admission_config.get("max_in_flight", 16),
+                                   max_retries=admission_config.get("max_retries", 4))
+
+    @functools.cached_property
+    def flights(self):
+        return SingleFlight()
+
+    @functools.cached_property
+    def verdict_cache(self):
+        # Verdicts are kept in memory; setting [verification] path also persists positive verdicts across restarts
+        verification_config = self.config("verification")
+        store = None
+        if verification_config.get("path"):
+            store = RoadmapCache(verification_config["path"], ttl=verification_config.get("ttl", 24 * 3600),
+                                 max_entries=verification_config.get("max_entries", 1024))
+
+        return VerdictCache(max_entries=verification_config.get("max_entries", 1024),
+                            ttl=verification_config.get("ttl", 24 * 3600),
+                            negative_ttl=verification_config.get("negative_ttl", 600.),
+                            store=store)
+
+    @functools.cached_property
+    def semantic_cache(self):
+        # [semantic] model names a local sentence-transformers model; without it topics are compared on hashed character n-grams
+        semantic_config = self.config("semantic")
+
+        def open_cache():
+            from core.semantic import SemanticCache, load_embedder
+
+            return SemanticCache(semantic_config.get("path", "semantic_cache.sqlite3"),
+                                 embedder=load_embedder(semantic_config.get("model")),
+                                 threshold=semantic_config.get("threshold", 0.85),
+                                 max_entries=semantic_config.get("max_entries", 5000))
+
+        return LazyResource("Semantic cache", open_cache).start()
+
+    def llm_client_settings(self):
+        from core.llm import TOGETHER_BASE_URL
+
+        # [local] base_url routes every agent to a local OpenAI-compatible server, e.g. vLLM with --enable-prefix-caching
+        local_config = self.config("local")
+        if local_config.get("base_url"):
+            return {"api_key": local_config.get("api_key", "local"), "base_url": local_config["base_url"],
+                    "max_connections": local_config.get("max_connections", 64)}
+
+        together_config = self.config("together")
+        return {"api_key": together_config["api_key"],
+                "base_url": together_config.get("base_url", TOGETHER_BASE_URL),
+                "max_connections": together_config.get("max_connections", 64),
+                "max_keepalive_connections": together_config.get("max_keepalive_connections", 32),
+                "keepalive_expiry": together_config.get("keepalive_expiry", 120.)}
+
+    @functools.cached_property
+    def llm_client(self):
+        def open_client():
+            from core import llm
+
+            return llm.LLMClient(**self.llm_client_settings())
+
+        return LazyResource("LLM client", open_client).start()
+
+    @functools.cached_property
+    def llm_params(self):
+        model = LLM_PARAMS["model"]
+        if self.config("local").get("base_url"):
+            model = self.config("local").get("model", model)
+
+        return {**LLM_PARAMS, "model": model}
+
+    @functools.cached_property
+    def ledger(self):
+        # [usage] path is the local ledger; [quota] limits are per teacher, 0 disables a limit. Revision loops are capped by
+        # default, the daily token budget only when configured
+        usage_config = self.config("usage")
+        quota_config = self.config("quota")
+        ledger = UsageLedger(usage_config.get("path", "usage_ledger.sqlite3"),
+                             flush_interval=usage_config.get("flush_interval", 5.),
+                             max_buffer=usage_config.get("max_buffer", 200),
+                             tokens_per_day=quota_config.get("tokens_per_day", 0),
+                             revisions_per_hour=quota_config.get("revisions_per_hour", 20))
+        self.metrics.subscribe(ledger.record)
+        return ledger
+
+    def resources(self):
+        return [self.cursor, self.llm_client, self.semantic_cache]
+
+    def health(self):
+        return {resource.name: resource.health() for resource in self.resources()}
+
+    def client(self, session_id: str, on_position=None, teacher: str = None):
+        return AdmittedClient(self.llm_client, self.admission, session_id, on_position=on_position, teacher=teacher)
+
+    def fetch_data(self, kelas: str, mapel: str, topik: str):
+        with self.metrics.span("fetch") as span:
+            data = self.summary_index.get(kelas=kelas, mapel=mapel, topik=topik)
+            span.set(found=data is not None, index_loaded=self.summary_index.loaded.is_set())
+
+        return data
+
+    def ground(self, kelas: str, mapel: str, topik: str, topik_details: str):
+        from core.retrieval import grounded_details
+
+        # Custom topics are mapped to the closest catalog chapters, whose ringkasan ground the roadmap
+        with self.metrics.span("grounding") as span:
+            matches = self.retrieval_index.search(f"{topik}\n{topik_details}", mapel=mapel, kelas=kelas, options=self.options)
+            span.set(matches=len(matches))
+
+        return grounded_details(topik_details, matches), matches
+
+    def similar(self, kelas: str, mapel: str, topik: str, topik_details: str, style: str, waktu: str, pertemuan: str):
+        with self.metrics.span("semantic_lookup") as span:
+            similar = self.semantic_cache.lookup(kelas=kelas, mapel=mapel, topik=topik, topik_details=topik_details, style=style,
+                                                 waktu=waktu, pertemuan=pertemuan, options=self.options)
+            span.set(cache="miss" if similar is None else "hit")
+
+        return similar
+
+    def remember(self, kelas: str, mapel: str, topik: str, topik_details: str, style: str, waktu: str, pertemuan: str, roadmap: str):
+        self.semantic_cache.add(kelas=kelas, mapel=mapel, topik=topik, topik_details=topik_details, style=style,
+                                waktu=waktu, pertemuan=pertemuan, roadmap=roadmap, options=self.options)
+
+    def _metered(self, stage: str, client, call, stream: bool, **attrs):
+        # One span per agent call; a stream's span ends when the stream is exhausted or closed, not when it is returned.
+        # The ledger records every span, and refuses the call up front when the teacher is over quota
+        teacher = getattr(client, "teacher", None)
+        self.ledger.check(teacher, stage)
+        span = self.metrics.span(stage).set(session=getattr(client, "session_id", None), teacher=teacher, model=self.llm_params["model"], **attrs)
+        metered = MeteredClient(client, span)
+        try:
+            result = call(metered)
+        except BaseException:
+            metered.finish("error")
+            raise
+
+        if not stream:
+            span.set(cache="miss" if span.attrs.get("requests") else "hit")
+            metered.finish()
+            return result
+
+        span.set(cache="hit" if isinstance(result, CachedRoadmap) else "miss")
+        return TimedStream(result, metered)
+
+    def teacher(self, client, kelas: str, mapel: str, topik: str, topik_details: str, style: str, style_details: str, waktu: str,
+                pertemuan: str, stream: bool = True, fresh: bool = False):
+        return self._metered("teacher", client, lambda metered: agent_teacher(metered, kelas=kelas, mapel=mapel, topik=topik, topik_details=topik_details,
+                                                                              style=style, style_details=style_details, waktu=waktu, pertemuan=pertemuan,
+                                                                              llm_params=self.llm_params, stream=stream, cache=self.roadmap_cache,
+                                                                              fresh=fresh, flights=self.flights, engine=self.generation_engine),
+                             stream, kelas=kelas, mapel=mapel, topik=topik, style=style, waktu=waktu, pertemuan=pertemuan, engine=self.generation_engine)
+
+    def reviser(self, client, previous_roadmap: str, feedback: str, stream: bool = True):
+        return self._metered("reviser", client, lambda metered: agent_reviser(metered, previous_roadmap=previous_roadmap, feedback=feedback,
+                                                                              llm_params=self.llm_params, stream=stream),
+                             stream)
+
+    def verificator(self, client, mapel: str, topik: str, topik_details: str):
+        return self._metered("verificator", client, lambda metered: agent_verificator(metered, mapel=mapel, topik=topik, topik_details=topik_details,
+                                                                                      llm_params=self.llm_params, verdicts=self.verdict_cache),
+                             False, mapel=mapel, topik=topik)
+
+    def stats(self):
+        stats = {"roadmap_cache": self.roadmap_cache.stats(), "verdicts": self.verdict_cache.stats(),
+                 "admission": self.admission.stats(), "flights": self.flights.stats(), "usage": self.ledger.stats()}
+        if self.llm_client.state == "ready":
+            stats["llm"] = self.llm_client.stats()
+
+        if self.semantic_cache.state == "ready":
+            stats["semantic"] = self.semantic_cache.stats()
+
+        return stats
@@ -0,0 +1,177 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+
+
+AGENTS = ("teacher", "reviser", "verificator")
+COLUMNS = ("created_at", "session", "teacher", "agent", "model", "engine", "kelas", "mapel", "topik", "style", "waktu", "pertemuan",
+           "prompt_tokens", "completion_tokens", "seconds", "outcome", "cache")
+GROUPS = ("session", "teacher", "agent", "model", "engine", "kelas", "mapel", "topik", "style", "waktu", "pertemuan", "outcome", "cache")
+
+
+class QuotaExceeded(Exception):
+
+    def __init__(self, teacher: str, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.teacher = teacher
+        self.retry_after = retry_after
+
+
+class UsageLedger:
+
+    # One row per agent call. record() only appends to a buffer; a background thread writes the buffer in one
+    # transaction every flush_interval seconds, or sooner once max_buffer rows are waiting
+    def __init__(self, path: str, flush_interval: float = 5., max_buffer: int = 200, tokens_per_day: int = 0, revisions_per_hour: int = 0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.tokens_per_day = tokens_per_day
+        self.revisions_per_hour = revisions_per_hour
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.counters = {"recorded": 0, "written": 0, "flushes": 0, "write_errors": 0, "quota_rejections": 0}
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                session TEXT,
+                teacher TEXT,
+                agent TEXT NOT NULL,
+                model TEXT,
+                engine TEXT,
+                kelas TEXT,
+                mapel TEXT,
+                topik TEXT,
+                style TEXT,
+                waktu TEXT,
+                pertemuan TEXT,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                seconds REAL NOT NULL,
+                outcome TEXT NOT NULL,
+                cache TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS usage_teacher ON usage (teacher, created_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS usage_created_at ON usage (created_at)")
+        logging.info(f"Usage ledger opened at {path}")
+
+        threading.Thread(target=self._run, name="usage-ledger", daemon=True).start()
+        atexit.register(self.flush)
+
+    def record(self, entry: dict):
+        # Subscribed to the engine's spans; only agent calls are kept
+        if entry.get("stage") not in AGENTS:
+            return
+
+        row = {**{column: entry.get(column) for column in COLUMNS}, "created_at": entry.get("started", time.time()), "agent": entry["stage"],
+               "prompt_tokens": int(entry.get("prompt_tokens", 0)), "completion_tokens": int(entry.get("completion_tokens", 0))}
+        with self.lock:
+            self.buffer.append(row)
+            self.counters["recorded"] += 1
+            full = len(self.buffer) >= self.max_buffer
+
+        if full:
+            self.wake.set()
+
+    def flush(self):
+        with self.lock:
+            rows, self.buffer = self.buffer, []
+
+        if not rows:
+            return
+
+        try:
+            with self.db_lock:
+                self.conn.execute("BEGIN")
+                self.conn.executemany(f"INSERT INTO usage ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                                      [tuple(row[column] for column in COLUMNS) for row in rows])
+                self.conn.execute("COMMIT")
+
+        except Exception as e:
+            logging.error(f"Failed to write {len(rows)} usage rows, keeping them for the next flush")
+            logging.error(e)
+            with self.db_lock:
+                if self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+
+            with self.lock:
+                self.buffer = rows + self.buffer
+                self.counters["write_errors"] += 1
+            return
+
+        with self.lock:
+            self.counters["written"] += len(rows)
+            self.counters["flushes"] += 1
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def _pending(self, **where):
+        with self.lock:
+            return [row for row in self.buffer if all(row[column] == value for column, value in where.items())]
+
+    def usage(self, teacher: str, since: float, agent: str = None):
+        # Flushed rows come from the index on (teacher, created_at); rows still in the buffer are added on top
+        query = "SELECT COUNT(*), COALESCE(SUM(prompt_tokens + completion_tokens), 0) FROM usage WHERE teacher = ? AND created_at >= ?"
+        params = [teacher, since]
+        if agent is not None:
+            query += " AND agent = ?"
+            params.append(agent)
+
+        with self.db_lock:
+            calls, tokens = self.conn.execute(query, params).fetchone()
+
+        pending = [row for row in self._pending(teacher=teacher) if row["created_at"] >= since and (agent is None or row["agent"] == agent)]
+        return {"calls": calls + len(pending), "tokens": tokens + sum(row["prompt_tokens"] + row["completion_tokens"] for row in pending)}
+
+    def check(self, teacher: str, agent: str):
+        # Called before an agent runs; a teacher over quota is refused before any tokens are spent
+        if teacher is None:
+            return
+
+        now = time.time()
+        if self.tokens_per_day and self.usage(teacher, now - 24 * 3600)["tokens"] >= self.tokens_per_day:
+            self._reject()
+            raise QuotaExceeded(teacher, f"Teacher {teacher} used {self.tokens_per_day} tokens in the last 24 hours", retry_after=3600.)
+
+        if agent == "reviser" and self.revisions_per_hour and self.usage(teacher, now - 3600, agent="reviser")["calls"] >= self.revisions_per_hour:
+            self._reject()
+            raise QuotaExceeded(teacher, f"Teacher {teacher} made {self.revisions_per_hour} revisions in the last hour", retry_after=600.)
+
+    def _reject(self):
+        with self.lock:
+            self.counters["quota_rejections"] += 1
+
+    def aggregate(self, by: tuple = ("topik",), since: float = None, limit: int = 20):
+        # Token totals grouped by any of GROUPS, most expensive first; flushes first so the buffer is included
+        by = [column for column in by if column in GROUPS]
+        if not by:
+            raise ValueError(f"Group by one of {GROUPS}")
+
+        self.flush()
+        columns = ", ".join(by)
+        with self.db_lock:
+            rows = self.conn.execute(f"""
+                SELECT {columns}, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), AVG(seconds),
+                       SUM(cache IS 'hit'), SUM(outcome NOT IN ('ok', 'incomplete'))
+                FROM usage WHERE created_at >= ? GROUP BY {columns}
+                ORDER BY SUM(prompt_tokens + completion_tokens) DESC LIMIT ?
+            """, (since or 0., limit)).fetchall()
+
+        return [{**dict(zip(by, row[:len(by)])), "calls": row[len(by)], "prompt_tokens": row[len(by) + 1], "completion_tokens": row[len(by) + 2],
+                 "seconds": round(row[len(by) + 3], 2), "cache_hits": row[len(by) + 4], "failures": row[len(by) + 5]} for row in rows]
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "buffered": len(self.buffer)}
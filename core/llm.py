@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import httpx
+from collections import OrderedDict
+from core.prompts import count_tokens
+
+
+TOGETHER_BASE_URL = "https://api.together.xyz/v1"
+MAX_TRACKED_PREFIXES = 256
+
+
+class LLMError(Exception):
+
+    def __init__(self, status_code: int, message: str, retry_after: float = None):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class Payload(dict):
+
+    # Gives JSON responses the attribute access of the Together SDK objects (response.choices[0].delta.content)
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        return wrap(self.get(name))
+
+
+def wrap(value):
+    if isinstance(value, dict) and not isinstance(value, Payload):
+        return Payload(value)
+
+    if isinstance(value, list):
+        return [wrap(item) for item in value]
+
+    return value
+
+
+async def _next(stream):
+    return await stream.__anext__()
+
+
+class SyncStream:
+
+    def __init__(self, client, stream):
+        self.client = client
+        self.stream = stream
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self.client.run(_next(self.stream))
+        except StopAsyncIteration:
+            raise StopIteration
+
+    def close(self):
+        self.client.run(self.stream.aclose())
+
+
+class AsyncStream:
+
+    def __init__(self, client, stream):
+        self.client = client
+        self.stream = stream
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.client.arun(_next(self.stream))
+
+    async def aclose(self):
+        await self.client.arun(self.stream.aclose())
+
+
+class Completions:
+
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, model: str, messages: list, max_tokens: int, temperature: float, stream: bool = False, **params):
+        if stream:
+            return SyncStream(self.client, self.client.stream_chat(model=model, messages=messages, max_tokens=max_tokens,
+                                                                   temperature=temperature, **params))
+
+        return self.client.run(self.client.chat_completion(model=model, messages=messages, max_tokens=max_tokens,
+                                                           temperature=temperature, **params))
+
+    async def acreate(self, model: str, messages: list, max_tokens: int, temperature: float, stream: bool = False, **params):
+        if stream:
+            return AsyncStream(self.client, self.client.stream_chat(model=model, messages=messages, max_tokens=max_tokens,
+                                                                    temperature=temperature, **params))
+
+        return await self.client.arun(self.client.chat_completion(model=model, messages=messages, max_tokens=max_tokens,
+                                                                  temperature=temperature, **params))
+
+
+class Chat:
+
+    def __init__(self, client):
+        self.completions = Completions(client)
+
+
+class LLMClient:
+
+    def __init__(self, api_key: str, base_url: str = TOGETHER_BASE_URL, max_connections: int = 64,
+                 max_keepalive_connections: int = 32, keepalive_expiry: float = 120., timeout: float = 180.):
+        self.counters = {"requests": 0, "in_flight": 0, "peak_in_flight": 0, "errors": 0, "connections_opened": 0, "tls_handshakes": 0,
+                         "prompt_tokens": 0, "prefix_hits": 0, "prefix_tokens_reused": 0, "cached_tokens": 0}
+        self.counters_lock = threading.Lock()
+        self.prefixes = OrderedDict()
+
+        # Every session shares one event loop thread and one keep-alive pool, so concurrent teachers
+        # are multiplexed over a bounded set of connections instead of one blocked thread and TLS handshake each
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-client", daemon=True)
+        self.thread.start()
+
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections,
+                              keepalive_expiry=keepalive_expiry)
+        self.http = httpx.AsyncClient(base_url=base_url, headers={"Authorization": f"Bearer {api_key}"}, limits=limits,
+                                      timeout=httpx.Timeout(timeout, connect=10.))
+        self.chat = Chat(self)
+        logging.info(f"LLM client ready for {base_url} (max {max_connections} connections)")
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def arun(self, coroutine):
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self.loop:
+            return await coroutine
+
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self.loop))
+
+    def _count(self, **deltas):
+        with self.counters_lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+
+            self.counters["peak_in_flight"] = max(self.counters["peak_in_flight"], self.counters["in_flight"])
+
+    async def _trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self._count(connections_opened=1)
+        elif event_name == "connection.start_tls.complete":
+            self._count(tls_handshakes=1)
+
+    def _track_prefix(self, messages: list):
+        # A leading system message sent before is a prefix the provider could serve from its prompt cache
+        prompt_tokens = sum(count_tokens(message["content"]) for message in messages)
+        system = "".join(message["content"] for message in messages[:1] if message["role"] == "system")
+        with self.counters_lock:
+            self.counters["prompt_tokens"] += prompt_tokens
+            if not system:
+                return
+
+            prefix = hashlib.sha256(system.encode("utf-8")).hexdigest()
+            if prefix in self.prefixes:
+                self.prefixes.move_to_end(prefix)
+                self.counters["prefix_hits"] += 1
+                self.counters["prefix_tokens_reused"] += self.prefixes[prefix]
+                return
+
+            self.prefixes[prefix] = count_tokens(system)
+            while len(self.prefixes) > MAX_TRACKED_PREFIXES:
+                self.prefixes.popitem(last=False)
+
+    def _track_usage(self, usage: dict):
+        # Servers that cache prefixes report how much of the prompt they did not have to process again
+        cached_tokens = ((usage or {}).get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        if cached_tokens:
+            self._count(cached_tokens=cached_tokens)
+
+    async def _raise_for_status(self, response: httpx.Response):
+        if response.status_code < 400:
+            return
+
+        await response.aread()
+        retry_after = response.headers.get("retry-after")
+        try:
+            retry_after = float(retry_after) if retry_after is not None else None
+        except ValueError:
+            retry_after = None
+
+        raise LLMError(response.status_code, response.text, retry_after=retry_after)
+
+    async def chat_completion(self, **payload):
+        self._count(requests=1, in_flight=1)
+        self._track_prefix(payload["messages"])
+        try:
+            response = await self.http.post("/chat/completions", json=payload, extensions={"trace": self._trace})
+            await self._raise_for_status(response)
+            data = response.json()
+            self._track_usage(data.get("usage"))
+            return wrap(data)
+
+        except Exception:
+            self._count(errors=1)
+            raise
+
+        finally:
+            self._count(in_flight=-1)
+
+    async def stream_chat(self, **payload):
+        self._count(requests=1, in_flight=1)
+        self._track_prefix(payload["messages"])
+        try:
+            async with self.http.stream("POST", "/chat/completions", json={**payload, "stream": True},
+                                        extensions={"trace": self._trace}) as response:
+                await self._raise_for_status(response)
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+
+                    chunk = json.loads(data)
+                    self._track_usage(chunk.get("usage"))
+                    yield wrap(chunk)
+
+        except Exception:
+            self._count(errors=1)
+            raise
+
+        finally:
+            self._count(in_flight=-1)
+
+    def stats(self):
+        with self.counters_lock:
+            stats = dict(self.counters)
+
+        stats["connection_reuse"] = 1. - stats["connections_opened"] / stats["requests"] if stats["requests"] else 0.
+        stats["prefix_reuse"] = stats["prefix_tokens_reused"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.
+        return stats
+
+    def close(self):
+        self.run(self.http.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
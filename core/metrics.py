@@ -0,0 +1,388 @@
+import bisect
+import logging
+import math
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from core.prompts import count_tokens, messages_tokens
+
+
+PREFIX = "edumapper"
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 20., 40., 60., 120.)
+MAX_SPANS = 500
+
+
+def percentile(values: list, q: float):
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+def label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def label_text(labels: tuple):
+    return ",".join(f'{name}="{label_value(value)}"' for name, value in labels)
+
+def flatten(stats: dict, prefix: str = ""):
+    # Nested stats() dicts become gauges; only numbers are exported
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{name}_")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{name}", value
+
+
+class Histogram:
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Span:
+
+    def __init__(self, metrics, stage: str, **labels):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+        self.attrs = {}
+        self.started = time.perf_counter()
+        self.wall = time.time()
+        self.first_token = None
+        self.duration = None
+        self.lock = threading.Lock()
+
+    def set(self, **attrs):
+        with self.lock:
+            self.attrs.update(attrs)
+
+        return self
+
+    def add(self, **attrs):
+        with self.lock:
+            for name, value in attrs.items():
+                self.attrs[name] = self.attrs.get(name, 0) + value
+
+    def token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.started
+
+    def finish(self, outcome: str = "ok"):
+        with self.lock:
+            if self.duration is not None:
+                return
+
+            self.duration = time.perf_counter() - self.started
+
+        self.metrics.record(self, outcome)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        self.finish("error" if kind is not None else self.attrs.get("outcome", "ok"))
+
+
+class Metrics:
+
+    # Counters and histograms in memory, rendered in the Prometheus text format on scrape; the last spans are kept
+    # as they were for the debug panel
+    def __init__(self, max_spans: int = MAX_SPANS):
+        self.histograms = {}
+        self.counters = {}
+        self.spans = deque(maxlen=max_spans)
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, listener):
+        # Listeners get every finished span as its debug panel entry, on the thread that finished it
+        self.listeners.append(listener)
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.histograms.setdefault(key, Histogram()).observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def span(self, stage: str, **labels):
+        return Span(self, stage, **labels)
+
+    def record(self, span: Span, outcome: str):
+        attrs = dict(span.attrs)
+        labels = {**span.labels, **({"cache": attrs["cache"]} if "cache" in attrs else {})}
+        self.observe("stage_seconds", span.duration, stage=span.stage)
+        self.inc("stage_total", stage=span.stage, outcome=outcome, **labels)
+
+        # Phases of the LLM calls in a span are observed under the same histogram, labelled with the agent
+        phases = {"queue": attrs.get("queue"), "first_token": span.first_token,
+                  "decode": None if span.first_token is None else span.duration - span.first_token}
+        for phase, seconds in phases.items():
+            if seconds is not None and attrs.get("requests"):
+                self.observe("stage_seconds", seconds, stage=phase, agent=span.stage)
+
+        for kind in ("prompt", "completion"):
+            if attrs.get(f"{kind}_tokens"):
+                self.inc("tokens_total", attrs[f"{kind}_tokens"], agent=span.stage, kind=kind)
+
+        entry = {"stage": span.stage, "started": span.wall, "seconds": round(span.duration, 3), "outcome": outcome,
+                 **{phase: round(seconds, 3) for phase, seconds in phases.items() if seconds is not None}, **span.labels, **attrs}
+        with self.lock:
+            self.spans.append(entry)
+
+        for listener in self.listeners:
+            try:
+                listener(entry)
+            except Exception as e:
+                logging.error("Span listener failed")
+                logging.error(e)
+
+        logging.info(f"Stage {span.stage} {outcome} in {span.duration:.2f}s {attrs}")
+
+    def recent(self, limit: int = 50):
+        with self.lock:
+            return list(self.spans)[-limit:][::-1]
+
+    def summary(self):
+        # Percentiles over the spans still kept, per stage
+        stages = {}
+        for entry in self.recent(len(self.spans)):
+            stages.setdefault(entry["stage"], []).append(entry)
+
+        rows = []
+        for stage, entries in sorted(stages.items()):
+            seconds = [entry["seconds"] for entry in entries]
+            first_tokens = [entry["first_token"] for entry in entries if entry.get("first_token") is not None]
+            rows.append({"stage": stage, "n": len(entries), "p50": percentile(seconds, 50), "p95": percentile(seconds, 95),
+                         "first_token_p50": percentile(first_tokens, 50) if first_tokens else None,
+                         "cache_hits": sum(entry.get("cache") == "hit" for entry in entries),
+                         "errors": sum(entry["outcome"] == "error" for entry in entries),
+                         "tokens": sum(entry.get("prompt_tokens", 0) + entry.get("completion_tokens", 0) for entry in entries)})
+
+        return rows
+
+    def render(self, gauges: dict = None):
+        lines = []
+        with self.lock:
+            histograms = dict(self.histograms)
+            counters = dict(self.counters)
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {PREFIX}_{name} counter")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{PREFIX}_{name}{{{label_text(labels)}}} {value}")
+
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {PREFIX}_{name} histogram")
+            for (metric, labels), histogram in sorted(histograms.items(), key=lambda item: item[0]):
+                if metric != name:
+                    continue
+
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (math.inf,), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else bound
+                    lines.append(f"{PREFIX}_{name}_bucket{{{label_text(labels + (('le', le),))}}} {cumulative}")
+
+                lines.append(f"{PREFIX}_{name}_sum{{{label_text(labels)}}} {histogram.sum}")
+                lines.append(f"{PREFIX}_{name}_count{{{label_text(labels)}}} {histogram.count}")
+
+        for name, value in flatten(gauges or {}):
+            lines.append(f"# TYPE {PREFIX}_{name} gauge")
+            lines.append(f"{PREFIX}_{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+class MeteredStream:
+
+    # Usage is added to the span once, when the stream ends or is closed; a stream closed early is charged what it has
+    # streamed so far
+    def __init__(self, client, response, messages: list):
+        self.client = client
+        self.response = response
+        self.messages = messages
+        self.last_usage = None
+        self.text = ""
+        self.recorded = False
+        self.lock = threading.Lock()
+
+    def _record(self):
+        with self.lock:
+            if self.recorded:
+                return
+
+            self.recorded = True
+
+        self.client.usage(self.last_usage, self.messages, self.text)
+        self.client._closed()
+
+    def __iter__(self):
+        try:
+            for chunk in self.response:
+                self.last_usage = getattr(chunk, "usage", None) or self.last_usage
+                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                    self.text += chunk.choices[0].delta.content
+
+                yield chunk
+        finally:
+            self._record()
+
+    def close(self):
+        close = getattr(self.response, "close", None)
+        if close is not None:
+            close()
+
+        self._record()
+
+
+class MeteredClient:
+
+    # Sits between an agent and its client and adds every request's queue time and token usage to the span; servers
+    # that do not report usage are estimated from the text. The span only ends once every stream opened through it has
+    # been recorded, so streams closed on a worker thread after a cancel are still charged
+    def __init__(self, client, span: Span):
+        self.client = client
+        self.span = span
+        self.open = 0
+        self.outcome = None
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=self)
+
+    def _admitted(self):
+        waited = getattr(self.client, "waited", None)
+        self.span.add(requests=1, queue=waited() if waited is not None else 0.)
+
+    def _closed(self):
+        with self.lock:
+            self.open -= 1
+            outcome = self.outcome if self.open == 0 else None
+
+        if outcome is not None:
+            self.span.finish(outcome)
+
+    def finish(self, outcome: str = "ok"):
+        # The first outcome wins; with streams still open it is recorded when the last one closes
+        with self.lock:
+            if self.outcome is not None:
+                return
+
+            self.outcome = outcome
+            if self.open:
+                return
+
+        self.span.finish(outcome)
+
+    def usage(self, usage, messages: list, text: str):
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        self.span.add(prompt_tokens=prompt_tokens if prompt_tokens is not None else messages_tokens(messages),
+                      completion_tokens=completion_tokens if completion_tokens is not None else count_tokens(text))
+
+    def create(self, stream: bool = False, **params):
+        response = self.client.chat.completions.create(stream=stream, **params)
+        self._admitted()
+        if stream:
+            with self.lock:
+                self.open += 1
+
+            return MeteredStream(self, response, params["messages"])
+
+        self.usage(getattr(response, "usage", None), params["messages"], response.choices[0].message.content or "")
+        return response
+
+    async def acreate(self, **params):
+        response = await self.client.chat.completions.acreate(**params)
+        self.span.add(requests=1)
+        self.usage(getattr(response, "usage", None), params["messages"], response.choices[0].message.content or "")
+        return response
+
+
+class TimedStream:
+
+    # Wraps the stream an agent returns; the span ends when the stream is exhausted or closed, and every other
+    # attribute (text, complete, finish_reason) is the wrapped stream's. The wrapped stream is closed before the outcome
+    # is set, so its usage is in the span
+    def __init__(self, stream, client: MeteredClient):
+        self.stream = stream
+        self.client = client
+        self.span = client.span
+
+    def __iter__(self):
+        try:
+            for delta in self.stream:
+                self.span.token()
+                yield delta
+        except GeneratorExit:
+            self.close()
+            raise
+        except BaseException:
+            self.stream.close()
+            self.client.finish("error")
+            raise
+
+        self.client.finish("ok" if self.stream.complete else "incomplete")
+
+    def close(self):
+        self.stream.close()
+        self.client.finish("cancelled")
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        return getattr(self.stream, name)
+
+
+class MetricsServer:
+
+    def __init__(self, metrics: Metrics, collect=None, host: str = "127.0.0.1", port: int = 9464):
+        handler = self._handler(metrics, collect)
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        logging.info(f"Metrics served on http://{self.server.server_address[0]}:{self.server.server_address[1]}/metrics")
+        return self
+
+    @staticmethod
+    def _handler(metrics: Metrics, collect):
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                try:
+                    body = metrics.render(collect() if collect is not None else None).encode("utf-8")
+                except Exception as e:
+                    logging.error("Failed to render metrics")
+                    logging.error(e)
+                    self.send_error(500)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
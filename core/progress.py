@@ -0,0 +1,57 @@
+import logging
+import time
+
+
+PIPELINE_STAGES = {
+    "verification": ("Memverifikasi input...", "Verifikasi"),
+    "fetch": ("Mengambil detail topik...", "Detail topik"),
+    "first_token": ("Menunggu respons model...", "Token pertama"),
+    "completion": ("Menulis roadmap...", "Penulisan roadmap"),
+}
+
+
+class NullProgressBar:
+
+    # Stands in for st.progress when the pipeline runs headless, e.g. from a benchmark or batch job
+    def progress(self, value: int, text: str = None):
+        pass
+
+    def empty(self):
+        pass
+
+
+class PipelineProgress:
+
+    def __init__(self, progress_bar, stages: list):
+        self.progress_bar = progress_bar or NullProgressBar()
+        self.stages = stages
+        self.durations = {}
+        self.percent = 0
+        self.started = time.perf_counter()
+        self.stage_started = self.started
+        self.progress_bar.progress(0, text=PIPELINE_STAGES[stages[0]][0])
+
+    def queued(self, position: int):
+        self.progress_bar.progress(self.percent, text=f"Menunggu antrean... (posisi {position})")
+
+    def done(self, stage: str):
+        now = time.perf_counter()
+        self.durations[stage] = now - self.stage_started
+        self.stage_started = now
+        logging.info(f"Pipeline stage {stage} finished in {self.durations[stage]:.2f}s")
+
+        finished = self.stages.index(stage) + 1
+        if finished == len(self.stages):
+            logging.info(f"Pipeline finished in {now - self.started:.2f}s")
+            self.progress_bar.empty()
+            return
+
+        running_text = PIPELINE_STAGES[self.stages[finished]][0]
+        done_label = PIPELINE_STAGES[stage][1]
+        self.percent = int(100 * finished / len(self.stages))
+        self.progress_bar.progress(self.percent,
+                                   text=f"{running_text} ({done_label} selesai dalam {self.durations[stage]:.1f} detik)")
+
+    def summary(self):
+        return " · ".join(f"{PIPELINE_STAGES[stage][1]}: {duration:.1f} detik" for stage, duration in self.durations.items())
+
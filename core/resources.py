@@ -0,0 +1,74 @@
+import logging
+import threading
+import time
+
+
+class LazyResource:
+
+    def __init__(self, name: str, factory, timeout: float = None):
+        self.name = name
+        self.factory = factory
+        self.timeout = timeout
+        self.value = None
+        self.error = None
+        self.state = "idle"
+        self.elapsed = None
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+
+    def start(self):
+        # Connects on a background thread; a failed resource is started again by the next caller that needs it
+        with self.lock:
+            if self.state in ("pending", "ready"):
+                return self
+
+            self.state = "pending"
+            self.error = None
+            self.ready.clear()
+
+        threading.Thread(target=self._run, name=f"resource-{self.name}", daemon=True).start()
+        return self
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            value = self.factory()
+
+        except Exception as e:
+            logging.error(f"Failed to start {self.name}")
+            logging.error(e)
+            self.error = e
+            self.state = "failed"
+
+        else:
+            self.value = value
+            self.state = "ready"
+            logging.info(f"{self.name} ready in {time.perf_counter() - started:.2f}s")
+
+        finally:
+            self.elapsed = time.perf_counter() - started
+            self.ready.set()
+
+    def get(self, timeout: float = None):
+        if self.state in ("idle", "failed"):
+            self.start()
+
+        timeout = timeout if timeout is not None else self.timeout
+        if not self.ready.wait(timeout):
+            raise TimeoutError(f"{self.name} is not ready after {timeout}s")
+
+        if self.state == "failed":
+            raise self.error
+
+        return self.value
+
+    def health(self):
+        return {"state": self.state, "elapsed": self.elapsed, "error": None if self.error is None else str(self.error)}
+
+    def __getattr__(self, name: str):
+        # Only reached for attributes of the wrapped resource, so a LazyResource can be passed wherever the resource is expected;
+        # the first use blocks until it is ready
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        return getattr(self.get(), name)
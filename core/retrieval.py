@@ -0,0 +1,159 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+import numpy as np
+from collections import Counter
+from core.semantic import ACRONYM_STOPWORDS, TOKEN_PATTERN, HashingEmbedder, expand_acronyms
+from core.verify import normalize
+
+
+STOPWORDS = ACRONYM_STOPWORDS | {"adalah", "pada", "ini", "itu", "dalam", "akan", "juga", "oleh", "sebagai", "tentang", "mempelajari", "materi"}
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_WEIGHT = 3
+BM25_WEIGHT = 0.4
+KELAS_BONUS = 0.05
+MAX_GROUNDING_CHARS = 3000
+
+
+def tokenize(text: str):
+    return [token for token in TOKEN_PATTERN.findall(normalize(text)) if token not in STOPWORDS]
+
+def summary_hash(bab: str, ringkasan: str):
+    return hashlib.sha256(f"{bab}\n{ringkasan}".encode("utf-8")).hexdigest()
+
+
+class Match:
+
+    def __init__(self, kelas: str, mapel: str, bab: str, ringkasan: str, score: float):
+        self.kelas = kelas
+        self.mapel = mapel
+        self.bab = bab
+        self.ringkasan = ringkasan
+        self.score = score
+
+
+class Corpus:
+
+    # Immutable once built; RetrievalIndex swaps in a new one with a single assignment, like SummaryIndex does
+    def __init__(self, docs: list, vectors):
+        self.docs = docs
+        self.vectors = vectors
+        self.postings = {}
+        self.lengths = []
+        for position, doc in enumerate(docs):
+            counts = Counter(tokenize(doc["bab"]) * TITLE_WEIGHT + tokenize(doc["ringkasan"]))
+            self.lengths.append(sum(counts.values()))
+            for token, count in counts.items():
+                self.postings.setdefault(token, []).append((position, count))
+
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.
+        self.idf = {token: math.log(1 + (len(docs) - len(postings) + 0.5) / (len(postings) + 0.5)) for token, postings in self.postings.items()}
+
+    def bm25(self, tokens: list):
+        scores = {}
+        for token in set(tokens):
+            for position, count in self.postings.get(token, []):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[position] / self.average_length)
+                scores[position] = scores.get(position, 0.) + self.idf[token] * count * (BM25_K1 + 1) / (count + norm)
+
+        return scores
+
+
+class RetrievalIndex:
+
+    def __init__(self, path: str, embedder=None, min_similarity: float = 0.25):
+        # Summaries and their metadata go to <path>.json, vectors to <path>.npy, which is memory-mapped rather than read into memory
+        self.path = path
+        self.embedder = embedder or HashingEmbedder()
+        self.min_similarity = min_similarity
+        self.lock = threading.Lock()
+        self.corpus = Corpus([], np.zeros((0, 0), dtype=np.float32))
+        self.updated_at = None
+
+        try:
+            with open(f"{path}.json", encoding="utf-8") as f:
+                meta = json.load(f)
+
+            if meta["embedder"] == self.embedder.name:
+                self.corpus = Corpus(meta["docs"], np.load(f"{path}.npy", mmap_mode="r"))
+                logging.info(f"Retrieval index loaded from {path} ({len(meta['docs'])} summaries)")
+
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Retrieval index at {path} unreadable, it will be rebuilt ({e})")
+
+    def update(self, summaries: dict):
+        # Only new or changed summaries are embedded again; unchanged rows are copied from the previous vectors
+        started = time.perf_counter()
+        with self.lock:
+            previous = {(doc["kelas"], doc["mapel"], doc["bab"]): (position, doc["hash"]) for position, doc in enumerate(self.corpus.docs)}
+            docs, rows, embedded = [], [], 0
+            for (kelas, mapel, bab), data in sorted(summaries.items(), key=lambda item: tuple(map(str, item[0]))):
+                ringkasan = data.get("ringkasan")
+                if not bab or not ringkasan:
+                    continue
+
+                digest = summary_hash(bab, ringkasan)
+                position, previous_digest = previous.get((kelas, mapel, bab), (None, None))
+                if previous_digest == digest:
+                    rows.append(np.asarray(self.corpus.vectors[position]))
+                else:
+                    rows.append(self.embedder.embed(f"{bab}\n{ringkasan}"))
+                    embedded += 1
+
+                docs.append({"kelas": kelas, "mapel": mapel, "bab": bab, "ringkasan": ringkasan, "hash": digest})
+
+            if not embedded and len(docs) == len(self.corpus.docs):
+                return
+
+            vectors = np.vstack(rows).astype(np.float32) if rows else np.zeros((0, 0), dtype=np.float32)
+            np.save(f"{self.path}.tmp.npy", vectors)
+            with open(f"{self.path}.tmp.json", "w", encoding="utf-8") as f:
+                json.dump({"embedder": self.embedder.name, "docs": docs}, f, ensure_ascii=False)
+
+            os.replace(f"{self.path}.tmp.npy", f"{self.path}.npy")
+            os.replace(f"{self.path}.tmp.json", f"{self.path}.json")
+            self.corpus = Corpus(docs, np.load(f"{self.path}.npy", mmap_mode="r"))
+            self.updated_at = time.time()
+
+        logging.info(f"Retrieval index updated: {len(docs)} summaries, {embedded} embedded in {time.perf_counter() - started:.2f}s")
+
+    def search(self, query: str, mapel: str = None, kelas: str = None, k: int = 2, options: dict = None):
+        corpus = self.corpus
+        candidates = [position for position, doc in enumerate(corpus.docs) if mapel is None or doc["mapel"] == mapel]
+        if not candidates:
+            return []
+
+        query = expand_acronyms(query, options)
+        bm25 = corpus.bm25(tokenize(query))
+        top_bm25 = max([bm25.get(position, 0.) for position in candidates] + [0.])
+        similarities = np.asarray(corpus.vectors[candidates]) @ self.embedder.embed(query)
+
+        matches = []
+        for position, similarity in zip(candidates, similarities):
+            if position not in bm25 or similarity < self.min_similarity:
+                continue
+
+            doc = corpus.docs[position]
+            score = BM25_WEIGHT * bm25[position] / top_bm25 + (1 - BM25_WEIGHT) * float(similarity)
+            score += KELAS_BONUS if doc["kelas"] == kelas else 0.
+            matches.append(Match(doc["kelas"], doc["mapel"], doc["bab"], doc["ringkasan"], score))
+
+        return sorted(matches, key=lambda match: match.score, reverse=True)[:k]
+
+    def stats(self):
+        return {"summaries": len(self.corpus.docs), "terms": len(self.corpus.postings), "updated_at": self.updated_at}
+
+
+def grounded_details(topik_details: str, matches: list):
+    if not matches:
+        return topik_details
+
+    references = "\n\n".join(f"Bab \"{match.bab}\" (kelas {match.kelas}, {match.mapel}):\n{match.ringkasan[:MAX_GROUNDING_CHARS]}" for match in matches)
+    return f"{topik_details}\n\nRingkasan bab buku yang paling terkait, gunakan sebagai acuan materi:\n{references}"
@@ -0,0 +1,280 @@
+import functools
+import json
+import re
+
+
+SECTION_TITLES = [
+    "Kriteria Pengajaran",
+    "Objektif Capaian",
+    "Road Map Pengajaran",
+    "Aktivitas Refleksi",
+    "Penilaian Formatif",
+    "Ide Kuis / Tes Singkat",
+    "Saran Media & Alat Bantu",
+    "Catatan Tambahan untuk Guru",
+]
+
+HEADING_PATTERN = re.compile(r"^[ \t]*(?:#{1,6}[ \t]*)?\*\*[ \t]*(" + "|".join(re.escape(title) for title in SECTION_TITLES) + r")[ \t]*:?[ \t]*\*\*[ \t]*:?[ \t]*$",
+                             re.IGNORECASE | re.MULTILINE)
+
+# Kriteria Pengajaran is never revised on its own: changing kelas, waktu or pertemuan reshapes every other section
+SECTION_KEYWORDS = {
+    "Objektif Capaian": ["objektif", "tujuan", "capaian", "kompetensi"],
+    "Road Map Pengajaran": ["road ?map pengajaran", "langkah", "kegiatan", "aktivitas pembelajaran", "pertemuan \\d+", "sesi", "pembukaan", "penutup"],
+    "Aktivitas Refleksi": ["refleksi", "jurnal", "exit ticket"],
+    "Penilaian Formatif": ["penilaian", "evaluasi", "asesmen", "formatif", "rubrik", "observasi"],
+    "Ide Kuis / Tes Singkat": ["kuis", "quiz", "tes", "soal", "pertanyaan"],
+    "Saran Media & Alat Bantu": ["media", "alat bantu", "alat peraga", "video", "gambar", "slide", "ppt"],
+    "Catatan Tambahan untuk Guru": ["catatan", "tips", "antisipasi"],
+}
+
+GLOBAL_KEYWORDS = ["semua", "seluruh", "keseluruhan", "semuanya", "dari awal", "durasi", "jumlah pertemuan", "gaya belajar", "bahasa",
+                   "format", "struktur"]
+
+MAX_TARGETED_SECTIONS = 3
+# Written by the section reviser instead of a revision when the feedback is not valid for the roadmap
+FEEDBACK_REJECTED = "<feedback_invalid>"
+# Sections given in full as context to a section revision; the others are only listed by heading
+OUTLINE_SECTIONS = ["Kriteria Pengajaran", "Objektif Capaian", "Road Map Pengajaran"]
+
+
+def _keyword_pattern(keywords: list):
+    return re.compile(r"\b(?:" + "|".join(keywords) + r")\b", re.IGNORECASE)
+
+SECTION_PATTERNS = {title: _keyword_pattern(keywords) for title, keywords in SECTION_KEYWORDS.items()}
+GLOBAL_PATTERN = _keyword_pattern(GLOBAL_KEYWORDS)
+
+
+def canonical_title(title: str):
+    title = " ".join(title.split()).lower()
+    for section_title in SECTION_TITLES:
+        if section_title.lower() == title:
+            return section_title
+
+def split_sections(text: str):
+    # Returns the text before the first heading and a list of (title, raw section text including its heading)
+    matches = list(HEADING_PATTERN.finditer(text))
+    if not matches:
+        return text, []
+
+    sections = []
+    for match, next_match in zip(matches, matches[1:] + [None]):
+        end = next_match.start() if next_match is not None else len(text)
+        sections.append((canonical_title(match.group(1)), text[match.start():end]))
+
+    return text[:matches[0].start()], sections
+
+def join_sections(preamble: str, sections: list):
+    return preamble + "".join(raw for _, raw in sections)
+
+def target_sections(roadmap: str, feedback: str):
+    # Returns the sections the feedback is about, or None when only a full revision makes sense
+    if GLOBAL_PATTERN.search(feedback):
+        return None
+
+    _, sections = split_sections(roadmap)
+    titles = [title for title, _ in sections]
+    if len(set(titles)) != len(titles) or len(titles) < 2:
+        return None
+
+    targets = [title for title in titles if title in SECTION_PATTERNS and SECTION_PATTERNS[title].search(feedback)]
+    if not targets or len(targets) > MAX_TARGETED_SECTIONS:
+        return None
+
+    return targets
+
+def roadmap_outline(roadmap: str, targets: list):
+    # The untouched part of the roadmap a section revision must stay consistent with
+    _, sections = split_sections(roadmap)
+    return "\n\n".join(raw.strip() if title in OUTLINE_SECTIONS else f"**{title}**" for title, raw in sections if title not in targets)
+
+def revised_section(title: str, raw: str, original: str):
+    # Keeps the whitespace that separated the original section from the next one
+    trailing = original[len(original.rstrip()):] or "\n\n"
+    return raw.strip() + trailing
+
+def splice_sections(roadmap: str, revision: str, targets: list):
+    if FEEDBACK_REJECTED in revision:
+        return roadmap
+
+    preamble, sections = split_sections(roadmap)
+    _, revised = split_sections(revision)
+    revised = dict(revised)
+    if not revised and len(targets) == 1 and revision.strip():
+        revised = {targets[0]: f"**{targets[0]}**\n\n{revision.strip()}"}
+
+    return join_sections(preamble, [(title, revised_section(title, revised[title], raw) if title in targets and title in revised else raw)
+                                    for title, raw in sections])
+
+
+ITEM_PATTERN = re.compile(r"^[ \t]*(?:[-*•]|\d+[.)])[ \t]+(.*)$")
+MEETING_PATTERN = re.compile(r"^[ \t]*(?:#{1,6}[ \t]*)?(?:\*\*)?[ \t]*(Pertemuan[ \t]+\d+[^*\n]*?)[ \t]*(?:\*\*)?[ \t]*:?[ \t]*$", re.IGNORECASE)
+OUTLINE_PATTERN = re.compile(r"^Pertemuan[ \t]+(\d+)[ \t]*[:.\-–—][ \t]*(.+)$", re.IGNORECASE)
+CRITERIA_PATTERN = re.compile(r"^[ \t]*[-*•][ \t]*([^:\n]+?)[ \t]*:[ \t]*(.*)$")
+
+
+def meeting_count(pertemuan: str):
+    match = re.search(r"\d+", pertemuan or "")
+    return int(match.group()) if match else 1
+
+def is_heading(line: str, titles: list = SECTION_TITLES):
+    match = HEADING_PATTERN.match(line)
+    return match is not None and canonical_title(match.group(1)) in titles
+
+def is_meeting_title(line: str):
+    return MEETING_PATTERN.match(line) is not None
+
+def is_meeting_heading(line: str):
+    # Only bold or markdown headings end a pertemuan; plain sentences may mention the next one
+    return is_meeting_title(line) and ("**" in line or line.lstrip().startswith("#"))
+
+def parse_outline(plan: str):
+    _, sections = split_sections(plan)
+    themes = {}
+    for line in dict(sections).get("Road Map Pengajaran", "").splitlines():
+        match = OUTLINE_PATTERN.match(strip_markdown(line).strip().lstrip("-*• ").strip())
+        if match:
+            themes.setdefault(int(match.group(1)), match.group(2).strip())
+
+    return themes
+
+def parse_items(body: str):
+    # Top-level list items; indented or unmarked lines are folded into the item above them
+    items = []
+    for line in body.splitlines():
+        match = ITEM_PATTERN.match(line)
+        if match and not line.startswith(("  ", "\t")):
+            items.append(match.group(1).strip())
+        elif items and line.strip():
+            items[-1] = f"{items[-1]} {line.strip()}"
+
+    return items
+
+def strip_markdown(text: str):
+    text = re.sub(r"^[ \t]*#{1,6}[ \t]*", "", text, flags=re.MULTILINE)
+    return re.sub(r"\*\*(.+?)\*\*", r"\1", text)
+
+
+class Meeting:
+
+    def __init__(self, title: str, steps: list):
+        self.title = title
+        self.steps = steps
+
+    def to_dict(self):
+        return {"title": self.title, "steps": self.steps}
+
+
+class Section:
+
+    def __init__(self, title: str, raw: str):
+        self.title = title
+        self.raw = raw
+        lines = raw.split("\n", 1)
+        self.body = lines[1].strip() if len(lines) > 1 else ""
+        self._items = None
+        self._meetings = None
+
+    @property
+    def items(self):
+        if self._items is None:
+            self._items = parse_items(self.body)
+
+        return self._items
+
+    @property
+    def meetings(self):
+        # Only the Road Map Pengajaran section is split per pertemuan
+        if self._meetings is None:
+            self._meetings = []
+            if self.title == "Road Map Pengajaran":
+                current = None
+                for line in self.body.splitlines():
+                    match = MEETING_PATTERN.match(line)
+                    if match:
+                        current = [match.group(1).strip(), []]
+                        self._meetings.append(current)
+                    elif current is not None:
+                        current[1].append(line)
+
+                self._meetings = [Meeting(title, parse_items("\n".join(lines))) for title, lines in self._meetings]
+
+        return self._meetings
+
+    def to_dict(self):
+        section = {"title": self.title, "text": self.body, "items": self.items}
+        if self.meetings:
+            section["meetings"] = [meeting.to_dict() for meeting in self.meetings]
+
+        return section
+
+
+class Roadmap:
+
+    def __init__(self, preamble: str, sections: list):
+        self.preamble = preamble
+        self.sections = sections
+
+    @classmethod
+    def parse(cls, text: str):
+        # Parsing is lossless: to_markdown() returns the original text, whatever the model wrote around the headings
+        preamble, sections = split_sections(text)
+        return cls(preamble, [Section(title, raw) for title, raw in sections])
+
+    def section(self, title: str):
+        for section in self.sections:
+            if section.title == title:
+                return section
+
+    def replace(self, title: str, raw: str):
+        return Roadmap(self.preamble, [Section(title, revised_section(title, raw, section.raw)) if section.title == title else section
+                                       for section in self.sections])
+
+    @property
+    def criteria(self):
+        section = self.section("Kriteria Pengajaran")
+        if section is None:
+            return {}
+
+        return {match.group(1).strip(): match.group(2).strip() for match in map(CRITERIA_PATTERN.match, section.body.splitlines()) if match}
+
+    @property
+    def quiz(self):
+        section = self.section("Ide Kuis / Tes Singkat")
+        return [] if section is None else section.items
+
+    @property
+    def complete(self):
+        return [section.title for section in self.sections] == SECTION_TITLES
+
+    def to_markdown(self):
+        return join_sections(self.preamble, [(section.title, section.raw) for section in self.sections])
+
+    def to_text(self):
+        return strip_markdown(self.to_markdown())
+
+    def to_dict(self):
+        roadmap = {"kriteria": self.criteria, "sections": [section.to_dict() for section in self.sections]}
+        if self.preamble.strip():
+            roadmap["preamble"] = self.preamble.strip()
+
+        return roadmap
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+
+RENDERERS = {
+    "md": (Roadmap.to_markdown, "text/markdown"),
+    "txt": (Roadmap.to_text, "text/plain"),
+    "json": (Roadmap.to_json, "application/json"),
+}
+
+
+@functools.lru_cache(maxsize=256)
+def parse_roadmap(text: str):
+    return Roadmap.parse(text)
+
+def render_roadmap(text: str, fmt: str):
+    renderer, mime = RENDERERS[fmt]
+    return renderer(parse_roadmap(text)), mime
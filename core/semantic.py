@@ -0,0 +1,191 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import zlib
+import numpy as np
+from core.verify import normalize
+
+
+ACRONYM_STOPWORDS = {"dan", "di", "ke", "dari", "yang", "untuk", "dengan", "serta", "atau"}
+ACRONYM_PATTERN = re.compile(r"\(([A-Z]{2,})\)")
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def acronym(title: str):
+    words = [word for word in TOKEN_PATTERN.findall(ACRONYM_PATTERN.sub("", title)) if word.lower() not in ACRONYM_STOPWORDS]
+    return "".join(word[0] for word in words).lower()
+
+_acronyms = (None, {})
+
+def acronyms(options: dict):
+    # Catalog titles double as the acronym dictionary: "SPLDV" expands to "Sistem Persamaan Linear Dua Variabel"
+    global _acronyms
+    if _acronyms[0] is not options:
+        expansions = {}
+        for mapel_options in options.values():
+            for topik_options in mapel_options.values():
+                for title in topik_options:
+                    full = ACRONYM_PATTERN.sub("", title).strip()
+                    candidates = [acronym(title)] + [match.lower() for match in ACRONYM_PATTERN.findall(title)]
+                    for candidate in candidates:
+                        if len(candidate) >= 3:
+                            expansions.setdefault(candidate, set()).add(full)
+
+        # An acronym shared by two different titles is ambiguous and left as typed
+        _acronyms = (options, {candidate: titles.pop() for candidate, titles in expansions.items() if len(titles) == 1})
+
+    return _acronyms[1]
+
+def expand_acronyms(text: str, options: dict = None):
+    if not options:
+        return text
+
+    expansions = acronyms(options)
+    return TOKEN_PATTERN.sub(lambda match: expansions.get(match.group().lower(), match.group()), text)
+
+
+class HashingEmbedder:
+
+    # Character n-grams hashed into a fixed number of buckets; needs nothing beyond numpy and is stable across processes
+    def __init__(self, dim: int = 1024, ngram_sizes: tuple = (3, 4, 5)):
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+        self.name = f"hashing-{dim}-{'-'.join(map(str, ngram_sizes))}"
+
+    def embed(self, text: str):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in TOKEN_PATTERN.findall(normalize(text)):
+            vector[zlib.crc32(word.encode("utf-8")) % self.dim] += 1
+            padded = f" {word} "
+            for size in self.ngram_sizes:
+                for start in range(len(padded) - size + 1):
+                    vector[zlib.crc32(padded[start:start + size].encode("utf-8")) % self.dim] += 1
+
+        vector = np.log1p(vector)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SentenceEmbedder:
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.name = f"sentence-{model_name}"
+
+    def embed(self, text: str):
+        return self.model.encode([text], normalize_embeddings=True)[0].astype(np.float32)
+
+def load_embedder(model_name: str = None):
+    if model_name:
+        try:
+            return SentenceEmbedder(model_name)
+        except Exception as e:
+            logging.warning(f"Embedding model {model_name} unavailable, falling back to hashed n-grams ({e})")
+
+    return HashingEmbedder()
+
+
+class SimilarRoadmap:
+
+    def __init__(self, topik: str, roadmap: str, score: float):
+        self.topik = topik
+        self.roadmap = roadmap
+        self.score = score
+
+
+class SemanticCache:
+
+    def __init__(self, path: str, embedder=None, threshold: float = 0.85, max_entries: int = 5000):
+        self.path = path
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.partitions = {}
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS semantic_roadmaps (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                embedder TEXT NOT NULL,
+                partition TEXT NOT NULL,
+                topik TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                roadmap TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS semantic_roadmaps_embedder ON semantic_roadmaps (embedder, partition)")
+
+        # Vectors written by a different embedder live in another space and are ignored, not compared
+        for row_id, partition, vector in self.conn.execute("SELECT id, partition, vector FROM semantic_roadmaps WHERE embedder = ? ORDER BY id",
+                                                           (self.embedder.name,)):
+            self._append(partition, row_id, np.frombuffer(vector, dtype=np.float32))
+
+        logging.info(f"Semantic cache opened at {path} ({sum(len(ids) for ids, _ in self.partitions.values())} entries, {self.embedder.name})")
+
+    @staticmethod
+    def partition(kelas: str, mapel: str, style: str, waktu: str, pertemuan: str):
+        # Only the topic is matched by similarity; every other input must be identical for a roadmap to be reused
+        return json.dumps([normalize(value or "") for value in (kelas, mapel, style, waktu, pertemuan)], ensure_ascii=False)
+
+    @staticmethod
+    def text(topik: str, topik_details: str, options: dict = None):
+        return expand_acronyms(f"{topik}\n{topik_details}", options)
+
+    def _append(self, partition: str, row_id: int, vector):
+        ids, matrix = self.partitions.get(partition, ([], np.zeros((0, vector.shape[0]), dtype=np.float32)))
+        self.partitions[partition] = (ids + [row_id], np.vstack([matrix, vector]))
+
+    def lookup(self, kelas: str, mapel: str, topik: str, topik_details: str, style: str, waktu: str, pertemuan: str, options: dict = None):
+        vector = self.embedder.embed(self.text(topik, topik_details, options))
+        with self.lock:
+            ids, matrix = self.partitions.get(self.partition(kelas, mapel, style, waktu, pertemuan), ([], None))
+            if not ids:
+                self.misses += 1
+                return None
+
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            row = self.conn.execute("SELECT topik, roadmap FROM semantic_roadmaps WHERE id = ?", (ids[best],)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+        logging.info(f"Semantic cache hit for {topik!r}: {row[0]!r} (similarity {scores[best]:.2f})")
+        return SimilarRoadmap(row[0], row[1], float(scores[best]))
+
+    def add(self, kelas: str, mapel: str, topik: str, topik_details: str, style: str, waktu: str, pertemuan: str, roadmap: str, options: dict = None):
+        vector = self.embedder.embed(self.text(topik, topik_details, options)).astype(np.float32)
+        partition = self.partition(kelas, mapel, style, waktu, pertemuan)
+        with self.lock:
+            row_id = self.conn.execute("INSERT INTO semantic_roadmaps (embedder, partition, topik, vector, roadmap, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                                       (self.embedder.name, partition, topik, vector.tobytes(), roadmap, time.time())).lastrowid
+            self._append(partition, row_id, vector)
+
+            evicted = [row[0] for row in self.conn.execute("SELECT id FROM semantic_roadmaps WHERE embedder = ? ORDER BY id DESC LIMIT -1 OFFSET ?",
+                                                            (self.embedder.name, self.max_entries))]
+            if evicted:
+                self.conn.execute(f"DELETE FROM semantic_roadmaps WHERE id IN ({','.join('?' * len(evicted))})", evicted)
+                evicted = set(evicted)
+                for key, (ids, matrix) in list(self.partitions.items()):
+                    keep = [index for index, row_id in enumerate(ids) if row_id not in evicted]
+                    self.partitions[key] = ([ids[index] for index in keep], matrix[keep])
+
+    def stats(self):
+        with self.lock:
+            return {"entries": sum(len(ids) for ids, _ in self.partitions.values()), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,142 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from core.cache import RoadmapCache
+
+
+# The same strings agent_verificator is prompted to return, so app.py handles both outcomes identically
+ERROR_TYPE_1 = "<generation_error_type_1>Mohon pastikan topik dan detail topik sudah lengkap dan menggunakan kalimat yang runtut dan mudah dipahami. Silakan perbaiki dan isi kembali.<generation_error_type_1>"
+ERROR_TYPE_2 = "<generation_error_type_2>Mohon pastikan mata pelajaran, topik dan detail topik sudah selaras dan menggunakan kalimat yang runtut dan mudah dipahami. Silakan perbaiki dan isi kembali.<generation_error_type_2>"
+
+MIN_TOPIK_CHARS = 3
+MIN_DETAILS_WORDS = 3
+MIN_LETTER_RATIO = 0.5
+GIBBERISH_RATIO = 0.5
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+CONSONANT_RUN_PATTERN = re.compile(r"[b-df-hj-np-tv-z]{5,}")
+REPEATED_PATTERN = re.compile(r"(.)\1{3,}")
+
+
+def normalize(text: str):
+    return " ".join(text.split()).casefold()
+
+def letter_ratio(text: str):
+    characters = [character for character in text if not character.isspace()]
+    if not characters:
+        return 0.
+
+    return sum(character.isalpha() for character in characters) / len(characters)
+
+def is_gibberish_word(word: str):
+    # Acronyms such as SPLDV or IPA have no vowels but are perfectly valid
+    if len(word) < 4 or word.isupper():
+        return False
+
+    word = word.lower()
+    return not set("aeiou").intersection(word) or bool(CONSONANT_RUN_PATTERN.search(word)) or bool(REPEATED_PATTERN.search(word))
+
+def looks_gibberish(text: str):
+    words = [word for word in WORD_PATTERN.findall(text) if len(word) >= 4]
+    return bool(words) and sum(map(is_gibberish_word, words)) / len(words) >= GIBBERISH_RATIO
+
+def unreadable(text: str, min_chars: int = 1, min_words: int = 1):
+    text = text.strip()
+    return (len(text) < min_chars or len(WORD_PATTERN.findall(text)) < min_words
+            or letter_ratio(text) < MIN_LETTER_RATIO or looks_gibberish(text))
+
+_topic_index = (None, {})
+
+def topic_index(options: dict):
+    # Built once per catalog object; a catalog refresh swaps in a new dict and the index is rebuilt on first use
+    global _topic_index
+    if _topic_index[0] is not options:
+        index = {}
+        for mapel_options in options.values():
+            for mapel, topik_options in mapel_options.items():
+                for option in topik_options:
+                    index.setdefault(normalize(option), set()).add(mapel)
+
+        _topic_index = (options, index)
+
+    return _topic_index[1]
+
+def catalog_mapel(options: dict, topik: str):
+    return topic_index(options).get(normalize(topik), set())
+
+def pre_verify(mapel: str, topik: str, topik_details: str, options: dict = None):
+    # Returns an error outcome for inputs that are obviously invalid, or None when only agent_verificator can decide
+    if unreadable(topik or "", min_chars=MIN_TOPIK_CHARS) or unreadable(topik_details or "", min_words=MIN_DETAILS_WORDS):
+        logging.info("Custom topic rejected by local verification (type 1)")
+        return ERROR_TYPE_1
+
+    if options:
+        matched = catalog_mapel(options, topik)
+        if matched and mapel not in matched:
+            logging.info(f"Custom topic belongs to {sorted(matched)} in the catalog, not {mapel} (type 2)")
+            return ERROR_TYPE_2
+
+    return None
+
+
+class VerdictCache:
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 24 * 3600, negative_ttl: float = 600., store: RoadmapCache = None):
+        # Rejections expire quickly: the verificator samples at temperature 0.5 and a one-off false rejection should not stick
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.store = store
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(mapel: str, topik: str, topik_details: str, model: str):
+        return RoadmapCache.key([{"role": "user", "content": "\n".join(normalize(value or "") for value in (mapel, topik, topik_details))}], {"model": model})
+
+    def _put(self, key: str, verdict: str, ttl: float):
+        self.entries[key] = (verdict, time.monotonic() + ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if entry is not None:
+                del self.entries[key]
+
+        verdict = self.store.get(key) if self.store is not None else None
+        with self.lock:
+            if verdict is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._put(key, verdict, self.ttl)
+            return verdict
+
+    def set(self, key: str, verdict: str):
+        positive = "<validation_success>" in verdict
+        if not positive and "<generation_error_type_" not in verdict:
+            # Anything else is a malformed answer and is verified again next time
+            return
+
+        with self.lock:
+            self._put(key, verdict, self.ttl if positive else self.negative_ttl)
+
+        if positive and self.store is not None:
+            self.store.set(key, verdict)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,202 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from core.agents import LLM_PARAMS, agent_teacher
+from core.cache import RoadmapCache
+from core.catalog import Catalog, dict_style, list_waktu, list_pertemuan
+from core.data import SummaryIndex, connect_mongodb
+from core.engine import load_secrets
+from core.llm import TOGETHER_BASE_URL, LLMClient
+from core.prompts import teacher_messages
+
+
+logging.basicConfig(level=logging.INFO,
+                    format="%(asctime)s - %(levelname)s - %(message)s",
+                    handlers=[
+                        logging.StreamHandler()
+                    ])
+
+
+class RateLimiter:
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60. / requests_per_minute
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+        self.paused_until = 0.
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, self.paused_until, now)
+            self.next_slot = slot + self.interval
+
+        time.sleep(max(0., slot - now))
+
+    def pause(self, seconds: float):
+        # A 429 from one worker holds back every worker, not only the one that was rejected
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class Checkpoint:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record["status"] == "done":
+                        self.done.add(tuple(record["combination"]))
+
+            logging.info(f"Resuming from {path}: {len(self.done)} combinations already generated")
+
+    def record(self, combination: tuple, status: str, error: str = None):
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"combination": combination, "status": status, "error": error, "time": time.time()}, ensure_ascii=False) + "\n")
+
+            if status == "done":
+                self.done.add(combination)
+
+
+def is_rate_limited(error: Exception):
+    return getattr(error, "status_code", None) == 429 or "RateLimit" in type(error).__name__
+
+
+def combinations(args, options: dict):
+    for kelas, mapel_options in options.items():
+        if args.kelas and kelas not in args.kelas:
+            continue
+
+        for mapel, topik_options in mapel_options.items():
+            if args.mapel and mapel not in args.mapel:
+                continue
+
+            for topik in topik_options:
+                if args.topik and topik not in args.topik:
+                    continue
+
+                for style, waktu, pertemuan in itertools.product(args.style or list(dict_style), args.waktu or list_waktu, args.pertemuan or list_pertemuan):
+                    yield (kelas, mapel, topik, style, waktu, pertemuan)
+
+
+def generate(client, cache: RoadmapCache, limiter: RateLimiter, combination: tuple, topik_details: str, max_retries: int):
+    kelas, mapel, topik, style, waktu, pertemuan = combination
+    style_details = dict_style[style]["Deskripsi"]
+    cache_key = cache.key(teacher_messages(kelas=kelas, mapel=mapel, topik=topik, topik_details=topik_details, style=style,
+                                           style_details=style_details, waktu=waktu, pertemuan=pertemuan), LLM_PARAMS)
+    if cache_key in cache:
+        return "cached"
+
+    for attempt in range(max_retries + 1):
+        limiter.wait()
+        try:
+            roadmap_stream = agent_teacher(client, kelas=kelas, mapel=mapel, topik=topik, topik_details=topik_details, style=style,
+                                           style_details=style_details, waktu=waktu, pertemuan=pertemuan, llm_params=LLM_PARAMS, stream=True)
+            for _ in roadmap_stream:
+                pass
+
+            if not roadmap_stream.complete:
+                raise RuntimeError(f"Generation ended with finish_reason={roadmap_stream.finish_reason}")
+
+            cache.set(cache_key, roadmap_stream.text, expires=False)
+            return "done"
+
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+
+            delay = min(60., 2 ** attempt) * random.uniform(0.5, 1.5)
+            if is_rate_limited(e):
+                limiter.pause(delay)
+
+            logging.warning(f"{combination} attempt {attempt + 1} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate catalog roadmaps into the roadmap cache read by app.py")
+    parser.add_argument("--kelas", nargs="*", help="Only these kelas (default: all)")
+    parser.add_argument("--mapel", nargs="*", help="Only these mata pelajaran (default: all)")
+    parser.add_argument("--topik", nargs="*", help="Only these topics (default: all)")
+    parser.add_argument("--style", nargs="*", choices=list(dict_style), help="Only these learning styles (default: all)")
+    parser.add_argument("--waktu", nargs="*", choices=list_waktu, help="Only these durations (default: all)")
+    parser.add_argument("--pertemuan", nargs="*", choices=list_pertemuan, help="Only these meeting counts (default: all)")
+    parser.add_argument("--limit", type=int, help="Stop after this many pending combinations")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent generations")
+    parser.add_argument("--rpm", type=float, default=30, help="Maximum requests per minute sent to Together")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--checkpoint", default="pregenerate_checkpoint.jsonl")
+    parser.add_argument("--catalog", default="catalog_snapshot.json", help="Catalog snapshot written by the app (default: built-in catalog if missing)")
+    parser.add_argument("--secrets", default=os.path.join(".streamlit", "secrets.toml"))
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many combinations would be generated")
+    args = parser.parse_args()
+
+    secrets = load_secrets(args.secrets)
+    cache_config = secrets.get("cache", {})
+    cache = RoadmapCache(cache_config.get("path", "roadmap_cache.sqlite3"),
+                         ttl=cache_config.get("ttl", 7 * 24 * 3600),
+                         max_entries=cache_config.get("max_entries", 5000))
+    checkpoint = Checkpoint(args.checkpoint)
+
+    catalog = Catalog(args.catalog)
+    pending = [combination for combination in combinations(args, catalog.options) if combination not in checkpoint.done]
+    if args.limit:
+        pending = pending[:args.limit]
+
+    logging.info(f"{len(pending)} combinations to generate")
+    if args.dry_run or not pending:
+        return
+
+    summary_index = SummaryIndex(connect_mongodb(secrets["mongo"]["username"], secrets["mongo"]["password"]))
+    summary_index.load()
+    summaries = {}
+    for kelas, mapel, topik in sorted({combination[:3] for combination in pending}):
+        data = summary_index.get(kelas=kelas, mapel=mapel, topik=topik)
+        if data is None or not data.get("ringkasan"):
+            logging.warning(f"No ringkasan for kelas {kelas} / {mapel} / {topik}, skipping it")
+            continue
+
+        summaries[(kelas, mapel, topik)] = data["ringkasan"]
+
+    client = LLMClient(api_key=secrets["together"]["api_key"], base_url=secrets["together"].get("base_url", TOGETHER_BASE_URL),
+                       max_connections=args.workers)
+    limiter = RateLimiter(args.rpm)
+    counts = {"done": 0, "cached": 0, "failed": 0}
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(generate, client, cache, limiter, combination, summaries[combination[:3]], args.max_retries): combination
+                   for combination in pending if combination[:3] in summaries}
+
+        for future in as_completed(futures):
+            combination = futures[future]
+            try:
+                status = future.result()
+                checkpoint.record(combination, "done")
+                counts[status] += 1
+
+            except Exception as e:
+                logging.error(f"{combination} failed: {e}")
+                checkpoint.record(combination, "failed", str(e))
+                counts["failed"] += 1
+
+            finished = sum(counts.values())
+            if finished % 10 == 0 or finished == len(futures):
+                logging.info(f"{finished}/{len(futures)} finished ({counts['done']} generated, {counts['cached']} already cached, {counts['failed']} failed)")
+
+    logging.info(f"LLM client: {client.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from core.admission import AdmissionController, AdmittedClient
+
+
+class SlowClient:
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=self)
+
+    async def acreate(self, **params):
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+
+def test_cancelled_queued_acreate_releases_its_slot():
+    controller = AdmissionController(rate=100., burst=10, max_in_flight=1)
+    client = AdmittedClient(SlowClient(), controller, "queued")
+
+    async def scenario():
+        controller.acquire("holder")
+        task = asyncio.ensure_future(client.acreate(messages=[]))
+        await asyncio.sleep(0.1)
+        assert controller.stats()["queued"] == 1
+
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        controller.release()
+        for _ in range(50):
+            if controller.stats()["in_flight"] == 0 and controller.stats()["queued"] == 0:
+                break
+
+            await asyncio.sleep(0.02)
+
+    asyncio.run(scenario())
+    time.sleep(0.1)
+    assert controller.stats()["in_flight"] == 0
+    assert controller.stats()["queued"] == 0
+
+
+def test_acreate_releases_its_slot_after_the_request():
+    controller = AdmissionController(rate=100., burst=10, max_in_flight=1)
+    client = AdmittedClient(SlowClient(), controller, "session")
+
+    response = asyncio.run(client.acreate(messages=[]))
+
+    assert response.choices[0].message.content == "ok"
+    assert controller.stats()["in_flight"] == 0
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+from core.agents import LLM_PARAMS, MAX_CONTINUATIONS, agent_teacher
+from core.cache import RoadmapCache
+
+
+class CutOffClient:
+
+    # Streams one chunk per request; the first cut_offs requests end at max_tokens
+    def __init__(self, cut_offs: int):
+        self.cut_offs = cut_offs
+        self.requests = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, stream: bool = False, **params):
+        assert stream
+        self.requests += 1
+        number = self.requests
+
+        def chunks():
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=f"part{number} "), finish_reason=None)])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None),
+                                                           finish_reason="length" if number <= self.cut_offs else "stop")])
+
+        return chunks()
+
+
+def teacher(client, cache):
+    return agent_teacher(client, kelas="7", mapel="IPA", topik="Zat", topik_details="Zat dan wujudnya", style="Experiential Learning",
+                         style_details="Belajar dari pengalaman", waktu="1 jam", pertemuan="2 kali", llm_params=LLM_PARAMS, cache=cache)
+
+
+def test_non_stream_teacher_continues_a_cut_off_roadmap(tmp_path):
+    cache = RoadmapCache(str(tmp_path / "cache.sqlite3"))
+    client = CutOffClient(cut_offs=1)
+
+    assert teacher(client, cache) == "part1 part2 "
+    assert client.requests == 2
+    assert cache.stats()["entries"] == 1
+
+
+def test_non_stream_teacher_does_not_cache_a_truncated_roadmap(tmp_path):
+    cache = RoadmapCache(str(tmp_path / "cache.sqlite3"))
+    client = CutOffClient(cut_offs=MAX_CONTINUATIONS + 1)
+
+    teacher(client, cache)
+
+    assert client.requests == MAX_CONTINUATIONS + 1
+    assert cache.stats()["entries"] == 0
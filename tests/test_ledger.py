@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+import pytest
+from core.engine import Engine
+from core.ledger import QuotaExceeded, UsageLedger
+
+
+ROADMAP = "**Kriteria Pengajaran**\n\n- Kelas : 7\n\n**Objektif Capaian**\n\n1. Memahami zat\n\n**Road Map Pengajaran**\n\n1. Pengamatan\n"
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.requests = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, stream: bool = False, **params):
+        self.requests += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=ROADMAP), finish_reason="stop")],
+                               usage=SimpleNamespace(prompt_tokens=100, completion_tokens=50))
+
+
+def engine_with_quota(tmp_path, **quota):
+    engine = Engine({"usage": {"path": str(tmp_path / "usage.sqlite3")}, "quota": quota,
+                     "cache": {"path": str(tmp_path / "cache.sqlite3")}}, cursor=object())
+    engine.__dict__["llm_client"] = FakeClient()
+    return engine
+
+
+def test_reviser_is_refused_past_the_hourly_revision_limit(tmp_path):
+    engine = engine_with_quota(tmp_path, revisions_per_hour=2)
+    client = engine.client("session", teacher="guru@example.com")
+
+    for _ in range(2):
+        engine.reviser(client, previous_roadmap=ROADMAP, feedback="Perbaiki seluruh roadmap", stream=False)
+
+    with pytest.raises(QuotaExceeded):
+        engine.reviser(client, previous_roadmap=ROADMAP, feedback="Perbaiki seluruh roadmap", stream=False)
+
+    assert engine.llm_client.requests == 2
+    assert engine.ledger.stats()["quota_rejections"] == 1
+
+    # Another teacher has a quota of their own
+    engine.reviser(engine.client("other", teacher="lain@example.com"), previous_roadmap=ROADMAP, feedback="Perbaiki seluruh roadmap", stream=False)
+
+
+def test_revisions_are_limited_by_default(tmp_path):
+    engine = engine_with_quota(tmp_path)
+
+    assert engine.ledger.revisions_per_hour > 0
+    assert engine.ledger.tokens_per_day == 0
+
+
+def test_daily_token_budget_counts_buffered_usage(tmp_path):
+    ledger = UsageLedger(str(tmp_path / "usage.sqlite3"), flush_interval=60., tokens_per_day=1000)
+    ledger.record({"stage": "teacher", "teacher": "guru", "prompt_tokens": 700, "completion_tokens": 300, "seconds": 1., "outcome": "ok"})
+
+    with pytest.raises(QuotaExceeded):
+        ledger.check("guru", "teacher")
+
+    ledger.check("lain", "teacher")
@@ -0,0 +1,17 @@
+from core.agents import LLM_PARAMS
+from core.prompts import MAX_OUTPUT_TOKENS, teacher_max_tokens
+
+
+def test_short_roadmaps_reserve_less_than_the_old_fixed_reservation():
+    for waktu, pertemuan in [("30 menit", "1 kali"), ("45 menit", "1 kali"), ("1 jam", "1 kali"), ("30 menit", "2 kali"), ("1 jam", "2 kali")]:
+        assert teacher_max_tokens(waktu, pertemuan) < LLM_PARAMS["max_tokens"]
+
+
+def test_reservation_grows_with_the_roadmap():
+    assert teacher_max_tokens("1 jam", "1 kali") < teacher_max_tokens("1 jam", "3 kali") < teacher_max_tokens("2 jam", "3 kali")
+
+
+def test_longest_roadmap_fits_the_output_limit():
+    tokens = teacher_max_tokens("2,5 jam", "4 kali")
+
+    assert LLM_PARAMS["max_tokens"] < tokens <= MAX_OUTPUT_TOKENS